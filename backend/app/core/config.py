@@ -13,6 +13,37 @@ class Settings(BaseModel):
     notification_delete_after_read_seconds: int = int(os.getenv("NOTIFICATION_DELETE_AFTER_READ_SECONDS", "43200"))
     # URL изображения для прикрепления к уведомлениям о дедлайнах (опционально)
     notification_image_url: Optional[str] = os.getenv("NOTIFICATION_IMAGE_URL", "https://i.pinimg.com/736x/28/28/7c/28287c47478349b53d46c3ce6b81d90f.jpg")
+    # Кэш ответов списков в памяти процесса
+    response_cache_enabled: bool = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    response_cache_max_entries: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+    response_cache_max_bytes: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    response_cache_ttl_seconds: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    # Инвертированный индекс тегов для фильтра tag_ids: сколько пользователей держать в памяти
+    tag_index_max_users: int = int(os.getenv("TAG_INDEX_MAX_USERS", "1000"))
+    # Поток событий GET /api/events: интервал heartbeat и сколько последних событий
+    # пользователя хранить для переподключения с Last-Event-ID
+    events_heartbeat_seconds: int = int(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+    events_history_size: int = int(os.getenv("EVENTS_HISTORY_SIZE", "200"))
+    # Сколько секунд действует токен потока (POST /api/events/token) для подключения
+    events_token_expire_seconds: int = int(os.getenv("EVENTS_TOKEN_EXPIRE_SECONDS", "60"))
+    # Доставка событий между процессами: memory - только внутри процесса (один воркер),
+    # sqlite - через таблицу event_log в общей БД (несколько воркеров и webhook_server.py)
+    events_broker: str = os.getenv("EVENTS_BROKER", "memory")
+    # Сколько событий может ждать отправки одному клиенту; при переполнении они
+    # заменяются событием resync
+    events_queue_size: int = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+    events_poll_interval_ms: int = int(os.getenv("EVENTS_POLL_INTERVAL_MS", "200"))
+    events_log_retention_seconds: int = int(os.getenv("EVENTS_LOG_RETENTION_SECONDS", "3600"))
+    # Импорт NDJSON (POST /api/import): сколько записей в одной транзакции и максимальный размер файла
+    import_batch_size: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+    import_max_bytes: int = int(os.getenv("IMPORT_MAX_BYTES", str(200 * 1024 * 1024)))
+    # Отложенная запись автосохранений заметок (только при одном воркере): не позже
+    # INTERVAL после первой правки или после IDLE без правок; MAX_NOTES - сколько
+    # заметок держать в буфере, сверх этого правки пишутся сразу
+    note_write_behind: bool = os.getenv("NOTE_WRITE_BEHIND", "0") == "1"
+    note_write_behind_interval_ms: int = int(os.getenv("NOTE_WRITE_BEHIND_INTERVAL_MS", "2000"))
+    note_write_behind_idle_ms: int = int(os.getenv("NOTE_WRITE_BEHIND_IDLE_MS", "500"))
+    note_write_behind_max_notes: int = int(os.getenv("NOTE_WRITE_BEHIND_MAX_NOTES", "10000"))
 
 
 settings = Settings()
@@ -1,23 +1,29 @@
+import hashlib
 import logging
-from fastapi import Depends, HTTPException, status
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from .db import get_db
 from .models.user import User
 from .security import decode_access_token
+from .services.sync_service import current_seq
+from .services.response_cache import CachedList
+from .services.note_write_buffer import note_write_buffer
+from .serializers import DEADLINE_MODE_ABSOLUTE
 
 logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-) -> User:
+def user_id_from_token(token: str | None, scope: str | None = None) -> int:
     """
-    Получает текущего авторизованного пользователя из токена.
+    Проверяет токен и возвращает id пользователя из него.
+    scope - назначение токена (None - основной токен входа).
     """
     if not token:
         raise HTTPException(
@@ -28,6 +34,12 @@ def get_current_user(
     try:
         payload = decode_access_token(token)
         
+        if payload.get("scope") != scope:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, 
+                detail="Токен не подходит для этого запроса"
+            )
+        
         user_id_str = payload.get("sub")
         
         if not user_id_str:
@@ -66,8 +78,13 @@ def get_current_user(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
                 detail="Не удалось проверить токен. Пожалуйста, войдите заново."
             )
+    return user_id
+
 
-    # Поиск пользователя в БД
+def load_user(db: Session, user_id: int) -> User:
+    """
+    Загружает пользователя из токена; если его нет в БД - 401.
+    """
     user = db.get(User, user_id)
     
     if user is None:
@@ -80,3 +97,83 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    token: str = Depends(oauth2_scheme), 
+    db: Session = Depends(get_db)
+) -> User:
+    """
+    Получает текущего авторизованного пользователя из токена.
+    """
+    return load_user(db, user_id_from_token(token))
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {value.strip() for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def conditional_get(extra: Optional[Callable[[Session, Request], Any]] = None, server_clock: bool = False):
+    """
+    Зависимость для условного GET списков.
+    
+    ETag строится из версии данных пользователя (sync_state.seq, растет в той же
+    транзакции, что и любое изменение) и URL запроса. Если клиент прислал
+    совпадающий If-None-Match, отвечаем 304 до выполнения запросов к спискам.
+    extra добавляет в ETag значение, от которого ответ зависит помимо данных
+    пользователя (например, текущее время). server_clock добавляет заголовок
+    X-Server-Time, по которому клиент сверяет часы.
+    
+    Возвращает CachedList: эндпоинт сначала пробует lookup(), а готовый
+    результат отдает через store(), который кладет его в кэш ответов.
+    """
+    def dependency(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        user: User = Depends(get_current_user),
+    ) -> CachedList:
+        version = current_seq(db, user.id)
+        # Отложенные автосохранения эндпоинты подставляют из буфера, не сбрасывая его:
+        # их версия меняет ETag так же, как seq
+        parts = [str(user.id), str(version), str(note_write_buffer.pending_version(user.id)),
+                 request.url.path, request.url.query]
+        if extra is not None:
+            parts.append(str(extra(db, request)))
+        digest = hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+        etag = f'W/"{version}-{digest}"'
+        
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if server_clock:
+            headers["X-Server-Time"] = datetime.now(timezone.utc).isoformat()
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return CachedList(user.id, etag, headers)
+    
+    return dependency
+
+
+# ETag для списков, зависящих только от данных пользователя
+list_etag = conditional_get()
+
+
+def _deadlines_clock(db: Session, request: Request) -> int | None:
+    """Минута, если ответ по дедлайнам зависит от текущего времени.
+
+    В режиме deadline_mode=absolute ответ содержит только даты (deadline_at и
+    границу статуса today_from), оставшееся время клиент считает сам, поэтому
+    ответ меняется только вместе с данными. Исключение - фильтр status: набор
+    дедлайнов в нем зависит от времени.
+    """
+    params = request.query_params
+    if params.get("deadline_mode") == DEADLINE_MODE_ABSOLUTE and not params.get("status"):
+        return None
+    return int(time.time() // 60)
+
+
+# Ответ по дедлайнам содержит оставшееся время, которое меняется каждую минуту
+deadlines_etag = conditional_get(_deadlines_clock, server_clock=True)
+# Стартовый снимок содержит дедлайны с оставшимся временем
+bootstrap_etag = deadlines_etag
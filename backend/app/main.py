@@ -5,8 +5,8 @@ from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 
 from .routers import health, auth
-from .routers import crud, webhook, settings
-from .db import engine, Base
+from .routers import crud, webhook, settings, sync, bootstrap, search, events, export, imports
+from .db import engine, Base, SessionLocal
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +24,22 @@ class LoggingMiddleware(BaseHTTPMiddleware):
 async def lifespan(app: FastAPI):
     # Startup
     from . import models  # noqa: F401
+    from sqlalchemy import inspect
+    existing_tables = set(inspect(engine).get_table_names())
     Base.metadata.create_all(bind=engine)
+    from .migrations import add_missing_columns, backfill_new_tables
+    backfill_new_tables(engine, existing_tables)
+    add_missing_columns(engine)
+    # create_all не добавляет новые индексы в уже существующие таблицы
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    from .services.search_service import ensure_search_index
+    ensure_search_index(engine)
+    # Папка "Все" и настройки для пользователей, созданных до их создания при регистрации
+    from .services.user_defaults import provision_missing_defaults
+    with SessionLocal() as db:
+        provision_missing_defaults(db)
     
     # Выполняем миграцию user_settings если нужно
     try:
@@ -113,11 +128,19 @@ async def lifespan(app: FastAPI):
     # Запускаем планировщик уведомлений о дедлайнах
     from .services.notification_service import start_scheduler, stop_scheduler
     start_scheduler()
+    # Доставка событий GET /api/events из других процессов (EVENTS_BROKER=sqlite)
+    from .services.events import event_broker
+    event_broker.start()
+    # Отложенная запись автосохранений заметок (NOTE_WRITE_BEHIND)
+    from .services.note_write_buffer import note_write_buffer
+    note_write_buffer.start()
     
     try:
         yield
     finally:
         # Shutdown
+        note_write_buffer.stop()
+        event_broker.stop()
         stop_scheduler()
 
 
@@ -141,6 +164,12 @@ def create_app() -> FastAPI:
     app.include_router(crud.router)
     app.include_router(webhook.router)
     app.include_router(settings.router)
+    app.include_router(sync.router)
+    app.include_router(bootstrap.router)
+    app.include_router(search.router)
+    app.include_router(events.router)
+    app.include_router(export.router)
+    app.include_router(imports.router)
 
     return app
 
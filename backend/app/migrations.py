@@ -0,0 +1,130 @@
+"""
+Добавление колонок, появившихся в моделях после создания таблиц.
+Base.metadata.create_all создает только отсутствующие таблицы и не меняет существующие.
+Новые таблицы с производными данными заполняются по существующим строкам.
+"""
+import logging
+
+from sqlalchemy import bindparam, inspect, text
+
+logger = logging.getLogger(__name__)
+
+# (таблица, колонка, DDL-определение колонки)
+ADDED_COLUMNS = [
+    ("tasks", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("folders", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("notes", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("deadlines", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("user_settings", "change_seq", "INTEGER NOT NULL DEFAULT 0"),
+    ("notes", "note_kind", "VARCHAR(8) NOT NULL DEFAULT 'text'"),
+    ("notes", "todo_total", "INTEGER"),
+    ("notes", "todo_done", "INTEGER"),
+    ("notes", "has_deadline_notifications", "BOOLEAN NOT NULL DEFAULT 0"),
+]
+
+# Флаг notes.has_deadline_notifications по таблице deadlines (меняет только расходящиеся строки)
+NOTE_DEADLINE_FLAGS_SQL = """
+    UPDATE notes SET has_deadline_notifications = flag FROM (
+        SELECT notes.id AS note_id, EXISTS (
+            SELECT 1 FROM deadlines
+            WHERE deadlines.note_id = notes.id AND deadlines.notification_enabled
+        ) AS flag
+        FROM notes
+    ) AS computed
+    WHERE notes.id = computed.note_id AND notes.has_deadline_notifications != computed.flag
+"""
+
+# Заполнение только что добавленной колонки для существующих строк
+# (ключ - последняя из колонок, которые использует запрос)
+COLUMN_BACKFILLS = {
+    # Тот же разбор, что и models.todo.todo_stats, но в SQL (JSON1), одним запросом
+    ("notes", "todo_done"): """
+        UPDATE notes SET
+            note_kind = 'todo',
+            todo_total = json_array_length(content, '$.items'),
+            todo_done = (
+                SELECT count(*) FROM json_each(notes.content, '$.items')
+                WHERE json_type(value, '$.completed') = 'true'
+            )
+        WHERE CASE
+            WHEN json_valid(content) THEN
+                json_type(content) = 'object'
+                AND json_extract(content, '$.type') = 'todo'
+                AND json_type(content, '$.items') = 'array'
+            ELSE 0
+        END
+    """,
+    ("notes", "has_deadline_notifications"): NOTE_DEADLINE_FLAGS_SQL,
+}
+
+# Заполнение таблицы, созданной create_all в этом запуске, по уже существующим данным
+TABLE_BACKFILLS = {
+    "tag_usage": [
+        """
+        INSERT INTO tag_usage (user_id, tag_id, note_count, task_count)
+        SELECT user_id, tag_id, sum(is_note), sum(1 - is_note) FROM (
+            SELECT notes.user_id, note_tag.tag_id, 1 AS is_note
+            FROM note_tag JOIN notes ON notes.id = note_tag.note_id
+            UNION ALL
+            SELECT tasks.user_id, task_tag.tag_id, 0 AS is_note
+            FROM task_tag JOIN tasks ON tasks.id = task_tag.task_id
+        )
+        GROUP BY user_id, tag_id
+        """,
+    ],
+}
+
+
+def backfill_new_tables(engine, existing_tables) -> None:
+    """Заполняет таблицы из TABLE_BACKFILLS, которых не было в existing_tables"""
+    with engine.begin() as conn:
+        for table, statements in TABLE_BACKFILLS.items():
+            if table in existing_tables:
+                continue
+            for statement in statements:
+                conn.execute(text(statement))
+            logger.info(f"Заполнена таблица {table}")
+
+
+def recompute_note_deadline_flags(conn) -> int:
+    """Пересчитывает notes.has_deadline_notifications; возвращает число исправленных заметок.
+
+    Исправленные заметки получают новый номер изменения пользователя (как
+    services.sync_service.change_seq), чтобы флаг дошел до клиентов через
+    дельта-синхронизацию и сменились ETag списков.
+    """
+    fixed = conn.execute(text(NOTE_DEADLINE_FLAGS_SQL + " RETURNING notes.id, notes.user_id")).all()
+    by_user = {}
+    for note_id, user_id in fixed:
+        by_user.setdefault(user_id, []).append(note_id)
+    for user_id, note_ids in by_user.items():
+        seq = conn.execute(text("""
+            INSERT INTO sync_state (user_id, seq) VALUES (:user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET seq = seq + 1
+            RETURNING seq
+        """), {"user_id": user_id}).scalar_one()
+        conn.execute(
+            text("UPDATE notes SET change_seq = :seq WHERE id IN :note_ids").bindparams(
+                bindparam("note_ids", expanding=True)
+            ),
+            {"seq": seq, "note_ids": note_ids},
+        )
+    return len(fixed)
+
+
+def add_missing_columns(engine) -> None:
+    """Добавляет в существующие таблицы колонки из ADDED_COLUMNS, которых в них еще нет"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table not in existing_tables:
+                continue
+            columns = {col["name"] for col in inspector.get_columns(table)}
+            if column in columns:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            logger.info(f"Добавлена колонка {table}.{column}")
+            backfill = COLUMN_BACKFILLS.get((table, column))
+            if backfill:
+                conn.execute(text(backfill))
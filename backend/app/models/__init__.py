@@ -1,5 +1,5 @@
 from .user import User
-from .todo import Task, Note, Tag, Deadline, DeadlineNotification
+from .todo import Task, Note, Tag, TagUsage, Deadline, DeadlineNotification
 from .user_settings import UserSettings
-
-
+from .sync import SyncState, Tombstone, IdempotencyKey, EventLog
+from .import_job import ImportJob
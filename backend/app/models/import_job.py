@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy.sql import func
+
+from ..db import Base
+
+IMPORT_PENDING = "pending"
+IMPORT_RUNNING = "running"
+IMPORT_DONE = "done"
+IMPORT_FAILED = "failed"
+
+
+class ImportJob(Base):
+    """Импорт NDJSON (POST /api/import): статус и счетчики для GET /api/import/{id}.
+
+    Записи импортируются пачками, каждая пачка - отдельная транзакция вместе с
+    обновлением счетчиков, поэтому счетчики всегда соответствуют записанным данным.
+    """
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(16), nullable=False, default=IMPORT_PENDING)
+    lines = Column(Integer, nullable=False, default=0)  # Прочитано строк
+    folders = Column(Integer, nullable=False, default=0)
+    notes = Column(Integer, nullable=False, default=0)
+    tasks = Column(Integer, nullable=False, default=0)
+    deadlines = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)  # Строки с ошибками
+    errors = Column(JSON, nullable=False, default=list)  # Первые ошибки: "Строка N: ..."
+    error = Column(Text, nullable=True)  # Причина, если импорт прерван (status=failed)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
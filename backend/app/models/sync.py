@@ -0,0 +1,67 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+
+from ..db import Base
+
+
+class SyncState(Base):
+    """Последний выданный номер изменения пользователя (монотонно растет)"""
+    __tablename__ = "sync_state"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    seq = Column(Integer, nullable=False, default=0)
+
+
+class Tombstone(Base):
+    """Запись об удаленном объекте для дельта-синхронизации"""
+    __tablename__ = "tombstones"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    entity = Column(String(16), nullable=False)  # "note", "task", "folder", "deadline"
+    entity_id = Column(Integer, nullable=False)
+    seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_tombstones_user_seq", "user_id", "seq"),
+    )
+
+
+class IdempotencyKey(Base):
+    """Результат операции POST /api/batch с ключом идемпотентности клиента.
+
+    Повтор операции с тем же ключом (например, повторная отправка офлайн-очереди)
+    не применяется заново, а возвращает сохраненный результат.
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(128), nullable=False)
+    result = Column(Text, nullable=False)  # JSON BatchResult
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),
+    )
+
+
+class EventLog(Base):
+    """Журнал событий для потока GET /api/events при нескольких процессах
+    (EVENTS_BROKER=sqlite): каждый процесс дописывает сюда свои события и
+    читает чужие. Старые записи удаляются через EVENTS_LOG_RETENTION_SECONDS.
+    """
+    __tablename__ = "event_log"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    type = Column(String(32), nullable=False)
+    data = Column(Text, nullable=False)  # JSON данных события
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_event_log_user_id", "user_id", "id"),
+        # AUTOINCREMENT: id не переиспользуются после очистки, по ним клиенты возобновляют поток
+        {"sqlite_autoincrement": True},
+    )
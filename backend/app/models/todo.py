@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, UniqueConstraint
+import json
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, UniqueConstraint, Index, event, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -29,6 +31,26 @@ class Tag(Base):
     color = Column(String(7), nullable=True)  # hex color like #FF5733
 
 
+class TagUsage(Base):
+    """Сколько заметок и задач пользователя помечены тегом.
+
+    Таблица tags общая, а список тегов пользователя строится отсюда. Счетчики
+    меняются вместе со связями note_tag/task_tag (services/tag_usage), строка
+    удаляется, когда оба счетчика становятся нулевыми.
+    """
+    __tablename__ = "tag_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    note_count = Column(Integer, nullable=False, default=0, server_default="0")
+    task_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Поиск тегов, которые больше никем не используются
+        Index("ix_tag_usage_tag", "tag_id"),
+    )
+
+
 class Task(Base):
     __tablename__ = "tasks"
     
@@ -39,8 +61,16 @@ class Task(Base):
     due_at = Column(DateTime(timezone=True), nullable=True)
     is_completed = Column(Boolean, nullable=False, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")  # Номер последнего изменения (дельта-синхронизация)
+
+    # Теги не загружаются вместе с задачей: для ответов API они берутся по id из services/tag_cache
+    tags = relationship("Tag", secondary=task_tag, backref="tasks", lazy="select")
 
-    tags = relationship("Tag", secondary=task_tag, backref="tasks", lazy="joined")
+    __table_args__ = (
+        # Keyset-пагинация списка задач: (created_at desc, id desc)
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+        Index("ix_tasks_user_change_seq", "user_id", "change_seq"),
+    )
 
 
 class Folder(Base):
@@ -51,9 +81,36 @@ class Folder(Base):
     name = Column(String(200), nullable=False)
     is_default = Column(Boolean, nullable=False, default=False)  # Папка "Все"
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     
     notes = relationship("Note", back_populates="folder", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_folders_user_change_seq", "user_id", "change_seq"),
+    )
+
+
+NOTE_KIND_TEXT = "text"
+NOTE_KIND_TODO = "todo"
+
+
+def todo_stats(content: str | None) -> tuple:
+    """(note_kind, todo_total, todo_done) для содержимого заметки.
+
+    Todo-заметка - это JSON {"type": "todo", "items": [{"id", "text", "completed"}, ...]}.
+    """
+    if not content:
+        return NOTE_KIND_TEXT, None, None
+    try:
+        parsed = json.loads(content)
+    except ValueError:
+        return NOTE_KIND_TEXT, None, None
+    if not isinstance(parsed, dict) or parsed.get("type") != "todo" or not isinstance(parsed.get("items"), list):
+        return NOTE_KIND_TEXT, None, None
+    items = parsed["items"]
+    done = sum(1 for item in items if isinstance(item, dict) and item.get("completed") is True)
+    return NOTE_KIND_TODO, len(items), done
+
 
 class Note(Base):
     __tablename__ = "notes"
@@ -66,11 +123,35 @@ class Note(Base):
     is_favorite = Column(Boolean, nullable=False, default=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Вычисляются из content при записи (см. _update_note_kind), чтобы не разбирать JSON при чтении
+    note_kind = Column(String(8), nullable=False, default=NOTE_KIND_TEXT, server_default=NOTE_KIND_TEXT)
+    todo_total = Column(Integer, nullable=True)  # Для todo: число пунктов
+    todo_done = Column(Integer, nullable=True)  # Для todo: число выполненных пунктов
+    # Есть ли у заметки дедлайн с включенными уведомлениями. Меняется вместе с дедлайном
+    # (эндпоинты /api/deadlines), чтобы чтение заметок обходилось без запросов к deadlines.
+    # Пересчитать: python repair_deadline_flags.py
+    has_deadline_notifications = Column(Boolean, nullable=False, default=False, server_default="0")
 
     folder = relationship("Folder", back_populates="notes")
-    tags = relationship("Tag", secondary=note_tag, backref="notes", lazy="joined")
+    tags = relationship("Tag", secondary=note_tag, backref="notes", lazy="select")  # см. Task.tags
     deadline = relationship("Deadline", back_populates="note", uselist=False, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset-пагинация списка заметок: (is_favorite desc, updated_at desc, id desc)
+        Index("ix_notes_user_favorite_updated", "user_id", "is_favorite", "updated_at", "id"),
+        Index("ix_notes_user_change_seq", "user_id", "change_seq"),
+    )
+
+
+@event.listens_for(Note, "before_insert")
+@event.listens_for(Note, "before_update")
+def _update_note_kind(mapper, connection, note: Note) -> None:
+    # Пересчитываем только при изменении content (и при вставке)
+    state = inspect(note)
+    if state.key is None or state.attrs.content.history.has_changes():
+        note.note_kind, note.todo_total, note.todo_done = todo_stats(note.content)
+
 
 class Deadline(Base):
     __tablename__ = "deadlines"
@@ -82,10 +163,19 @@ class Deadline(Base):
     notification_enabled = Column(Boolean, nullable=False, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
     
     note = relationship("Note", back_populates="deadline")
     notifications = relationship("DeadlineNotification", back_populates="deadline", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_deadlines_user_change_seq", "user_id", "change_seq"),
+        # Выборка дедлайнов за период с сортировкой (GET /api/deadlines)
+        Index("ix_deadlines_user_deadline_at", "user_id", "deadline_at", "id"),
+        # Дедлайны всех пользователей, пересекшие границу статуса (планировщик)
+        Index("ix_deadlines_deadline_at", "deadline_at"),
+    )
+
 
 class DeadlineNotification(Base):
     __tablename__ = "deadline_notifications"
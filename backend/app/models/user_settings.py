@@ -15,6 +15,7 @@ class UserSettings(Base):
     notification_times_minutes = Column(JSON, nullable=False, default=lambda: [30])  # Массив минут до дедлайна для уведомлений (до 10 штук)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")  # Номер последнего изменения (дельта-синхронизация)
 
     user = relationship("User", backref="settings")
 
@@ -0,0 +1,80 @@
+"""
+Keyset-пагинация списков с непрозрачным курсором.
+"""
+import base64
+import json
+from typing import Any, List
+
+from fastapi import HTTPException
+from sqlalchemy import String, cast, literal, tuple_
+from sqlalchemy.sql.elements import Cast
+
+# Ограничения размера страницы
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Кодирует значения ключа сортировки последней строки страницы в курсор"""
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Декодирует курсор, выданный encode_cursor. Бросает 400 при неверном формате."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+    if not isinstance(values, list) or len(values) != size or not all(
+        value is None or isinstance(value, (str, int, float, bool)) for value in values
+    ):
+        raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+    return values
+
+
+def raw_text(column):
+    """Значение колонки в том виде, в каком оно хранится в SQLite.
+
+    DateTime-колонки в SQLite хранятся строками в разных форматах (server_default
+    пишет без микросекунд, Python - с микросекундами), поэтому курсор хранит
+    исходную строку и сравнивается с колонкой как строка, ровно как при ORDER BY.
+    """
+    return cast(column, String)
+
+
+def keyset_after(columns: list, values: List[Any], descending: bool = True):
+    """Условие "строка идет после курсора" для сортировки всех колонок по убыванию
+    (или по возрастанию при descending=False).
+
+    Сравнение значений строки: (a, b, c) < (x, y, z). SQLite (3.15+) использует
+    его как диапазон по индексу (user_id, a, b, c) и начинает чтение сразу с
+    курсора; раскрытие в (a < x) OR (a = x AND b < y) OR ... индекс дальше
+    user_id не использует и просматривает все строки до курсора. Колонки
+    raw_text сравниваются без CAST (иначе индекс не подходит): строка курсора
+    сравнивается с хранимой строкой так же, как при ORDER BY.
+    """
+    seek_columns = [column.clause if isinstance(column, Cast) else column for column in columns]
+    bound = [literal(value, String) if isinstance(value, str) else literal(value) for value in values]
+    if descending:
+        return tuple_(*seek_columns) < tuple_(*bound)
+    return tuple_(*seek_columns) > tuple_(*bound)
+
+
+def fetch_page(query, sort_columns: list, limit: int | None, cursor: str | None, descending: bool = True):
+    """Выполняет запрос постранично.
+
+    Запрос должен быть уже отсортирован по sort_columns (по убыванию, при
+    descending=False - по возрастанию) и выбирать их последними колонками строки.
+    Возвращает (rows, next_cursor).
+    """
+    if cursor is not None:
+        query = query.filter(keyset_after(sort_columns, decode_cursor(cursor, len(sort_columns)), descending))
+    page_size = limit or DEFAULT_PAGE_LIMIT
+    # Берем на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = query.limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(list(rows[-1][-len(sort_columns):]))
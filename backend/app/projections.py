@@ -0,0 +1,118 @@
+"""
+Сборка JSON ответов списков прямо в SQLite (JSON1).
+
+Запрос возвращает для каждой строки готовый JSON-объект в формате схемы ответа
+(NoteOut, TaskOut), теги агрегируются подзапросом через json_group_array.
+Python только склеивает строки в массив: без ORM-объектов, identity map и
+повторной валидации pydantic. Порядок ключей совпадает со схемами в schemas.py.
+"""
+import json
+from typing import Iterable, List
+
+from sqlalchemy import case, func, literal, select
+
+from .models.todo import Task, Note, Tag, Folder, Deadline, note_tag, task_tag
+
+
+def json_bool(condition):
+    """SQL-условие как JSON true/false (без json() SQLite отдал бы 1/0)"""
+    return func.json(case((condition, "true"), else_="false"))
+
+
+def sql_isoformat(column):
+    """Повторяет datetime.isoformat() для DateTime-колонки, хранящейся в SQLite строкой.
+
+    SQLAlchemy хранит "YYYY-MM-DD HH:MM:SS.ffffff", server_default - без микросекунд;
+    isoformat() отбрасывает нулевые микросекунды.
+    """
+    micro = func.substr(column, 21, 6)
+    return case(
+        (column.is_(None), None),
+        else_=func.replace(func.substr(column, 1, 19), " ", "T").op("||")(
+            case((micro.in_(["", "000000"]), ""), else_=literal(".").op("||")(micro))
+        ),
+    )
+
+
+def _tags_json(association_table, owner_column, owner_id):
+    subquery = (
+        select(func.json_group_array(tag_json()))
+        .select_from(association_table.join(Tag, Tag.id == association_table.c.tag_id))
+        .where(association_table.c[owner_column] == owner_id)
+        .scalar_subquery()
+    )
+    return func.json(subquery)
+
+
+def tag_ids(association_table, owner_column, owner_id):
+    """id тегов объекта одной строкой через запятую (group_concat), см. parse_tag_ids"""
+    return (
+        select(func.group_concat(association_table.c.tag_id))
+        .where(association_table.c[owner_column] == owner_id)
+        .scalar_subquery()
+    )
+
+
+def parse_tag_ids(value: str | None) -> List[int]:
+    return sorted(int(tag_id) for tag_id in value.split(",")) if value else []
+
+
+def note_json():
+    """JSON NoteOut для строки notes"""
+    return func.json_object(
+        "id", Note.id,
+        "title", Note.title,
+        "content", Note.content,
+        "folder_id", Note.folder_id,
+        "is_favorite", json_bool(Note.is_favorite),
+        "tags", _tags_json(note_tag, "note_id", Note.id),
+        "has_deadline_notifications", json_bool(Note.has_deadline_notifications),
+        "version", Note.change_seq,
+    )
+
+
+def task_json():
+    """JSON TaskOut для строки tasks"""
+    return func.json_object(
+        "id", Task.id,
+        "title", Task.title,
+        "description", Task.description,
+        "due_at", sql_isoformat(Task.due_at),
+        "is_completed", json_bool(Task.is_completed),
+        "tags", _tags_json(task_tag, "task_id", Task.id),
+    )
+
+
+def folder_json():
+    """JSON папки для строки folders (как FolderOut)"""
+    return func.json_object(
+        "id", Folder.id,
+        "name", Folder.name,
+        "is_default", json_bool(Folder.is_default),
+        "created_at", sql_isoformat(Folder.created_at),
+    )
+
+
+def tag_json():
+    """JSON TagOut для строки tags"""
+    return func.json_object("name", Tag.name, "id", Tag.id, "color", Tag.color)
+
+
+def deadline_json():
+    """JSON дедлайна для строки deadlines (без полей, зависящих от текущего времени)"""
+    return func.json_object(
+        "id", Deadline.id,
+        "note_id", Deadline.note_id,
+        "deadline_at", sql_isoformat(Deadline.deadline_at),
+        "notification_enabled", json_bool(Deadline.notification_enabled),
+    )
+
+
+def json_array_body(items: Iterable[str]) -> bytes:
+    """Склеивает готовые JSON-объекты в массив"""
+    return ("[" + ",".join(items) + "]").encode()
+
+
+def json_page_body(items: Iterable[str], next_cursor: str | None) -> bytes:
+    """Склеивает готовые JSON-объекты в страницу {items, next_cursor}"""
+    return ('{"items":[' + ",".join(items) + '],"next_cursor":' + json.dumps(next_cursor) + "}").encode()
@@ -1,6 +1,5 @@
 import time
 import logging
-from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -13,6 +12,8 @@ from ..models.user import User
 from ..schemas import UserCreate, UserOut, Token, LoginRequest
 from ..security import create_access_token
 from ..deps import get_current_user
+from ..serializers import user_to_out
+from ..services.user_defaults import create_user
 
 
 router = APIRouter(prefix="/auth", tags=["auth"]) 
@@ -32,8 +33,7 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
         if existing_uuid is not None:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Пользователь с таким UUID уже зарегистрирован")
 
-        user = User(username=payload.username, uuid=payload.uuid)
-        db.add(user)
+        user = create_user(db, payload.username, payload.uuid)
         db.commit()
         db.refresh(user)
         return user
@@ -230,8 +230,7 @@ def auth_webapp(body: WebAppInit, db: Session = Depends(get_db)):
                     current_username = f"{base_username}_{user_id}"
             
             # Создаем нового пользователя
-            new_user = User(username=current_username, uuid=uuid)
-            db.add(new_user)
+            new_user = create_user(db, current_username, uuid)
             db.commit()
             db.refresh(new_user)
             break
@@ -318,13 +317,5 @@ def get_me(user: User = Depends(get_current_user)):
     Получает данные текущего авторизованного пользователя.
     Используется для получения информации о пользователе после авторизации.
     """
-    # Конвертируем created_at в строку перед возвратом модели
-    # Это необходимо, так как Pydantic v2 с from_attributes=True может не вызывать field_serializer правильно
-    user_dict = {
-        "id": user.id,
-        "username": user.username,
-        "uuid": user.uuid,
-        "created_at": user.created_at.isoformat() if isinstance(user.created_at, datetime) else str(user.created_at)
-    }
-    return UserOut(**user_dict)
+    return user_to_out(user)
 
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from typing import Any, Literal
+import logging
+
+from ..db import get_db
+from ..deps import get_current_user, bootstrap_etag
+from ..models.todo import Note, Folder, Deadline
+from ..models.user import User
+from ..schemas import BootstrapOut
+from ..serializers import user_to_out, settings_to_out, folder_to_out, deadline_to_out, DEADLINE_MODE_RELATIVE
+from ..projections import note_json, json_array_body
+from ..services.note_write_buffer import note_write_buffer, overlay_note_json
+from ..services.response_cache import CachedList
+from ..services.tag_usage import user_tags
+from ..services.user_defaults import get_settings
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+_serializer = TypeAdapter(Any)
+
+
+@router.get("/bootstrap", response_model=BootstrapOut)
+def bootstrap(
+    deadline_mode: Literal["relative", "absolute"] = DEADLINE_MODE_RELATIVE,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    cache: CachedList = Depends(bootstrap_etag),
+):
+    """Начальное состояние приложения одним запросом.
+
+    Заменяет стартовые /auth/me, /api/settings, /api/folders, /api/notes,
+    /api/notes/favorite, /api/tags и /api/deadlines: одна сессия, один
+    get_current_user и по одному запросу на раздел. Заметки собираются
+    JSON-проекцией в SQL, избранная берется из того же списка.
+    deadline_mode=absolute - дедлайны без оставшегося времени, как в GET /api/deadlines.
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
+    settings = get_settings(db, user.id)
+    if settings is None:
+        raise HTTPException(status_code=404, detail="Настройки не найдены")
+    
+    # Папка "Все" идет первой
+    folders = db.query(Folder).filter(
+        Folder.user_id == user.id
+    ).order_by(Folder.is_default.desc(), Folder.created_at.asc()).all()
+    
+    # Тот же порядок, что и у GET /api/notes: избранная заметка идет первой
+    note_rows = db.query(note_json(), Note.is_favorite, Note.id).filter(
+        Note.user_id == user.id
+    ).order_by(Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc()).all()
+    # Несохраненные автосохранения из буфера записи, как в GET /api/notes
+    pending = note_write_buffer.user_pending(user.id)
+    notes = [overlay_note_json(body, pending[note_id]) if note_id in pending else body for body, _, note_id in note_rows]
+    favorite_note = next((body for body, (_, is_favorite, _) in zip(notes, note_rows) if is_favorite), None)
+    
+    tags = user_tags(db, user.id)
+    # Тот же порядок, что и у GET /api/deadlines: по (deadline_at, id)
+    deadlines = db.query(Deadline).filter(
+        Deadline.user_id == user.id
+    ).order_by(Deadline.deadline_at, Deadline.id).all()
+    
+    # Части, которые не собраны в SQL, сериализуем так же, как отдельные эндпоинты
+    def dump(value) -> str:
+        return _serializer.dump_json(value).decode()
+    
+    body = (
+        '{"user":' + dump(user_to_out(user))
+        + ',"settings":' + dump(settings_to_out(settings))
+        + ',"folders":' + dump([folder_to_out(f) for f in folders])
+        + ',"notes":' + json_array_body(notes).decode()
+        + ',"favorite_note":' + (favorite_note if favorite_note is not None else "null")
+        + ',"tags":' + dump(tags)
+        + ',"deadlines":' + dump([deadline_to_out(d, deadline_mode) for d in deadlines])
+        + "}"
+    )
+    return cache.store_body(body.encode())
@@ -1,31 +1,64 @@
-from datetime import datetime, timezone
-from typing import List, Set, Tuple
-import re
-import hashlib
-import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Literal, Set, Tuple
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import delete, insert
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import case, delete, func, insert, null, select
 
 from ..db import get_db
-from ..deps import get_current_user
-from ..models.todo import Task, Note, Tag, Folder, note_tag, task_tag, Deadline, DeadlineNotification
+from ..deps import get_current_user, list_etag, deadlines_etag
+from ..services.response_cache import CachedList
+from ..services.sync_service import mark_changed, mark_deleted, change_seq
+from ..services.item_input import extract_hashtags, tag_color, parse_due_at
+from ..services.tag_cache import tag_cache, note_tags
+from ..services.tag_usage import adjust_tag_usage, user_tags
+from ..services.tag_index import tag_index, MODE_ANY
+from ..services.note_delta import apply_note_delta, NoteDeltaError, NoteDeltaConflict
+from ..services.note_write_buffer import note_write_buffer, overlay_note_json, BUFFERED_FIELDS
+from ..services.user_defaults import default_folder_id, get_or_create_default_folder_id
+from ..serializers import tag_to_out, task_to_out, note_to_out, folder_to_out, deadline_to_out
+from ..serializers import DEADLINE_MODE_RELATIVE, DEADLINE_TODAY_WINDOW
+from ..projections import (
+    note_json,
+    task_json,
+    json_array_body,
+    json_page_body,
+    tag_ids,
+    parse_tag_ids,
+)
+from ..pagination import MAX_PAGE_LIMIT, fetch_page, raw_text
+from ..models.todo import Task, Note, Tag, Folder, note_tag, task_tag, Deadline, DeadlineNotification, NOTE_KIND_TODO, todo_stats
+from ..models.sync import IdempotencyKey
 from ..schemas import (
     TaskCreate,
     TaskOut,
+    TaskPage,
     TaskUpdate,
     NoteCreate,
+    NoteDelta,
     NoteOut,
+    NotePage,
+    NoteSummaryOut,
+    NoteSummaryPage,
     NoteUpdate,
     TagOut,
+    TagUsageOut,
     FolderCreate,
     FolderOut,
+    FolderCountsOut,
     FolderUpdate,
     DeadlineCreate,
     DeadlineUpdate,
     DeadlineOut,
+    DeadlineAgendaOut,
+    DeadlinePage,
+    BatchOperation,
+    BatchRequest,
+    BatchResult,
+    BatchOut,
 )
 
 
@@ -33,27 +66,6 @@ router = APIRouter(prefix="/api", tags=["crud"])
 logger = logging.getLogger(__name__)
 
 
-def _extract_hashtags(text: str | None) -> Set[str]:
-    """Извлекает имена тегов из текста с хэштегами"""
-    if not text:
-        return set()
-    pattern = re.compile(r"#([A-Za-zА-Яа-я0-9_]+)")
-    return {m.group(1).lower() for m in pattern.finditer(text)}
-
-
-def _generate_color(name: str) -> str:
-    """Генерирует цвет на основе имени тега"""
-    hash_obj = hashlib.md5(name.encode())
-    hash_int = int(hash_obj.hexdigest(), 16)
-    colors = [
-        "#FF6B6B", "#4ECDC4", "#45B7D1", "#FFA07A", "#98D8C8",
-        "#F7DC6F", "#BB8FCE", "#85C1E2", "#F8B739", "#52BE80",
-        "#EC7063", "#5DADE2", "#F4D03F", "#82E0AA", "#F1948A",
-        "#7FB3D3", "#F5B041", "#AED6F1", "#A9DFBF", "#F9E79F"
-    ]
-    return colors[hash_int % len(colors)]
-
-
 def _get_or_create_tags(db: Session, tag_names: Set[str]) -> List[Tag]:
     """Получает существующие теги или создает новые"""
     if not tag_names:
@@ -67,7 +79,7 @@ def _get_or_create_tags(db: Session, tag_names: Set[str]) -> List[Tag]:
     new_tags = []
     for name in tag_names:
         if name not in existing_names:
-            tag = Tag(name=name, color=_generate_color(name))
+            tag = Tag(name=name, color=tag_color(name))
             db.add(tag)
             new_tags.append(tag)
     
@@ -77,8 +89,16 @@ def _get_or_create_tags(db: Session, tag_names: Set[str]) -> List[Tag]:
     return existing_tags + new_tags
 
 
-def _update_tags_for_item(db: Session, item, tag_names: Set[str], item_id: int, is_note: bool = False):
-    """Обновляет теги для задачи или заметки через прямой SQL"""
+def _update_tags_for_item(db: Session, user_id: int, item_id: int, tag_names: Set[str], current_tag_ids: List[int], is_note: bool = False) -> List[TagOut]:
+    """Обновляет теги задачи или заметки через прямой SQL, меняя только разницу.
+    
+    Возвращает новые теги для ответа. Если набор тегов не изменился (обычное
+    автосохранение), запросов к БД нет. Счетчики tag_usage меняются на ту же разницу.
+    """
+    current_tags = tag_cache.resolve(db, current_tag_ids)
+    if {tag.name for tag in current_tags} == tag_names:
+        return current_tags
+    
     # Получаем или создаем теги
     tags = _get_or_create_tags(db, tag_names)
     
@@ -86,102 +106,148 @@ def _update_tags_for_item(db: Session, item, tag_names: Set[str], item_id: int,
     association_table = note_tag if is_note else task_tag
     id_column = "note_id" if is_note else "task_id"
     
-    # Удаляем все существующие связи
-    db.execute(delete(association_table).where(association_table.c[id_column] == item_id))
+    new_ids = {tag.id for tag in tags}
+    removed_ids = set(current_tag_ids) - new_ids
+    added_ids = new_ids - set(current_tag_ids)
     
-    # Добавляем новые связи
-    if tags:
-        values = [{id_column: item_id, "tag_id": tag.id} for tag in tags]
+    if removed_ids:
+        db.execute(delete(association_table).where(
+            association_table.c[id_column] == item_id,
+            association_table.c.tag_id.in_(removed_ids)
+        ))
+    if added_ids:
+        values = [{id_column: item_id, "tag_id": tag_id} for tag_id in added_ids]
         db.execute(insert(association_table).values(values))
+    adjust_tag_usage(db, user_id, added_ids, removed_ids, is_note)
+    tag_index.record(db, user_id, is_note, item_id, added_ids, removed_ids)
     
-    db.flush()
+    return [tag_to_out(tag) for tag in sorted(tags, key=lambda tag: tag.id)]
+
+
+MAX_FILTER_TAGS = 50
+
+
+def _parse_tag_filter(tag_id: int | None, tag_ids: str | None) -> List[int]:
+    """Теги фильтра списка: tag_id (один тег) и tag_ids=1,2,3"""
+    result = [] if tag_id is None else [tag_id]
+    if tag_ids:
+        try:
+            result += [int(value) for value in tag_ids.split(",") if value.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Неверный список тегов")
+    if len(result) > MAX_FILTER_TAGS:
+        raise HTTPException(status_code=400, detail=f"Можно указать не более {MAX_FILTER_TAGS} тегов")
+    return list(dict.fromkeys(result))
+
+
+def _tag_filter(db: Session, user_id: int, id_column, is_note: bool, tag_ids: List[int], mode: str):
+    """Условие "объект помечен любым/всеми тегами": id берутся из индекса тегов в памяти
+    и передаются в SQLite одним JSON-массивом"""
+    item_ids = tag_index.match(db, user_id, is_note, tag_ids, mode)
+    ids_json = "[" + ",".join(map(str, item_ids)) + "]"
+    return id_column.in_(select(func.json_each(ids_json).table_valued("value").c.value))
 
 
 # Tags
-@router.get("/tags", response_model=List[TagOut])
-def list_tags(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    return db.query(Tag).order_by(Tag.name.asc()).all()
+@router.get("/tags", response_model=List[TagUsageOut])
+def list_tags(db: Session = Depends(get_db), user=Depends(get_current_user), cache: CachedList = Depends(list_etag)):
+    """Теги, которыми пользователь пометил свои заметки и задачи, по убыванию использования"""
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    return cache.store(user_tags(db, user.id))
 
 
 # Tasks
-@router.get("/tasks", response_model=List[TaskOut])
-def list_tasks(tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    query = db.query(Task).options(joinedload(Task.tags)).filter(
+@router.get("/tasks", response_model=List[TaskOut] | TaskPage)
+def list_tasks(
+    tag_id: int | None = None,
+    tag_ids: str | None = None,
+    mode: Literal["any", "all"] = MODE_ANY,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    cache: CachedList = Depends(list_etag),
+):
+    """Список задач пользователя.
+
+    Без limit/cursor возвращает все задачи списком (поведение для старых клиентов).
+    С limit или cursor возвращает страницу {items, next_cursor} с keyset-пагинацией
+    по (created_at desc, id desc).
+    tag_ids=1,2,3 оставляет задачи с любым (mode=any) или со всеми (mode=all) тегами;
+    tag_id - прежний фильтр по одному тегу.
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
+    paginated = limit is not None or cursor is not None
+    sort_columns = [raw_text(Task.created_at), Task.id]
+    # JSON каждой задачи собирается в SQL, ORM-объекты не создаются
+    query = db.query(task_json(), *sort_columns).filter(
         Task.user_id == user.id
     )
     
-    # Фильтр по тегу
-    if tag_id is not None:
-        # Используем exists для более надежной фильтрации
-        from sqlalchemy import exists
-        query = query.filter(
-            exists().where(
-                (task_tag.c.task_id == Task.id) & 
-                (task_tag.c.tag_id == tag_id)
-            )
-        )
+    # Фильтр по тегам
+    filter_tags = _parse_tag_filter(tag_id, tag_ids)
+    if filter_tags:
+        query = query.filter(_tag_filter(db, user.id, Task.id, False, filter_tags, mode))
     
-    tasks = query.order_by(Task.created_at.desc()).all()
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    if paginated:
+        rows, next_cursor = fetch_page(query, sort_columns, limit, cursor)
+    else:
+        rows = query.all()
     
-    result = []
-    for t in tasks:
-        # Явно преобразуем теги
-        tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (t.tags or [])]
-        result.append(TaskOut(
-            id=t.id,
-            title=t.title,
-            description=t.description,
-            due_at=t.due_at.isoformat() if t.due_at else None,
-            is_completed=t.is_completed,
-            tags=tags_list
-        ))
-    return result
+    items = [row[0] for row in rows]
+    if not paginated:
+        return cache.store_body(json_array_body(items))
+    return cache.store_body(json_page_body(items, next_cursor))
 
 
-@router.post("/tasks", response_model=TaskOut)
-def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    due_dt = datetime.fromisoformat(payload.due_at) if payload.due_at else None
+def _create_task(db: Session, user_id: int, payload: TaskCreate) -> TaskOut:
+    """Создает задачу без коммита (общая часть POST /tasks и /batch)"""
     task = Task(
-        user_id=user.id,
+        user_id=user_id,
         title=payload.title,
         description=payload.description,
-        due_at=due_dt
+        due_at=parse_due_at(payload.due_at)
     )
     
+    mark_changed(db, user_id, task)
     db.add(task)
     db.flush()  # Сохраняем задачу чтобы получить ID
-    task_id = task.id
     
     # Обрабатываем теги ПОСЛЕ добавления задачи в сессию
+    tags = []
     if payload.tags_text:
-        tag_names = _extract_hashtags(payload.tags_text)
-        _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
+        tag_names = extract_hashtags(payload.tags_text)
+        tags = _update_tags_for_item(db, user_id, task.id, tag_names, [], is_note=False)
     
+    # Ответ собираем до коммита из состояния сессии: после коммита объект
+    # просрочен и любое обращение к атрибутам перечитало бы строку
+    return task_to_out(task, tags)
+
+
+@router.post("/tasks", response_model=TaskOut)
+def create_task(payload: TaskCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    result = _create_task(db, user.id, payload)
     db.commit()
-    
-    # Перезагружаем с тегами
-    task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (task.tags or [])]
-    return TaskOut(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        due_at=task.due_at.isoformat() if task.due_at else None,
-        is_completed=task.is_completed,
-        tags=tags_list
-    )
+    return result
 
 
-@router.patch("/tasks/{task_id}", response_model=TaskOut)
-def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    task = db.query(Task).options(joinedload(Task.tags)).filter(
+def _update_task(db: Session, user_id: int, task_id: int, payload: TaskUpdate) -> TaskOut:
+    """Обновляет задачу без коммита"""
+    # Задача и id ее тегов одним запросом
+    row = db.query(Task, tag_ids(task_tag, "task_id", Task.id)).filter(
         Task.id == task_id,
-        Task.user_id == user.id
+        Task.user_id == user_id
     ).first()
     
-    if task is None:
+    if row is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    task, current_tag_ids = row[0], parse_tag_ids(row[1])
     
     # Обновляем поля
     if payload.title is not None:
@@ -189,122 +255,133 @@ def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db)
     if payload.description is not None:
         task.description = payload.description
     if payload.due_at is not None:
-        task.due_at = datetime.fromisoformat(payload.due_at) if payload.due_at else None
+        task.due_at = parse_due_at(payload.due_at)
     if payload.is_completed is not None:
         task.is_completed = payload.is_completed
     
     # Обновляем теги
     if payload.tags_text is not None:
-        tag_names = _extract_hashtags(payload.tags_text)
-        _update_tags_for_item(db, task, tag_names, task_id, is_note=False)
+        tag_names = extract_hashtags(payload.tags_text)
+        tags = _update_tags_for_item(db, user_id, task_id, tag_names, current_tag_ids, is_note=False)
+    else:
+        tags = tag_cache.resolve(db, current_tag_ids)
     
+    mark_changed(db, user_id, task)
+    return task_to_out(task, tags)
+
+
+@router.patch("/tasks/{task_id}", response_model=TaskOut)
+def update_task(task_id: int, payload: TaskUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    result = _update_task(db, user.id, task_id, payload)
     db.commit()
-    
-    # Перезагружаем с тегами
-    task = db.query(Task).options(joinedload(Task.tags)).filter(Task.id == task_id).first()
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (task.tags or [])]
-    return TaskOut(
-        id=task.id,
-        title=task.title,
-        description=task.description,
-        due_at=task.due_at.isoformat() if task.due_at else None,
-        is_completed=task.is_completed,
-        tags=tags_list
-    )
+    return result
 
 
-@router.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    task = db.get(Task, task_id)
-    if task is None or task.user_id != user.id:
+def _delete_task(db: Session, user_id: int, task_id: int) -> None:
+    """Удаляет задачу без коммита"""
+    row = db.query(Task, tag_ids(task_tag, "task_id", Task.id)).filter(
+        Task.id == task_id,
+        Task.user_id == user_id
+    ).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    task = row[0]
+    mark_deleted(db, user_id, "task", task.id)
     db.delete(task)
+    removed_ids = parse_tag_ids(row[1])
+    adjust_tag_usage(db, user_id, [], removed_ids, is_note=False)
+    tag_index.record(db, user_id, False, task_id, [], removed_ids)
+
+
+@router.delete("/tasks/{task_id}")
+def delete_task(task_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    _delete_task(db, user.id, task_id)
     db.commit()
     return {"ok": True}
 
 
 # Folders
-def _get_or_create_default_folder(db: Session, user_id: int, commit_if_new: bool = False) -> Tuple[Folder, bool]:
-    """Получает или создает папку 'Все' для пользователя
-    
-    Returns:
-        tuple: (Folder, was_created) - папка и флаг, была ли она создана
-    """
-    try:
-        default_folder = db.query(Folder).filter(
-            Folder.user_id == user_id,
-            Folder.is_default == True
-        ).first()
-        
-        was_created = False
-        if not default_folder:
-            default_folder = Folder(
-                user_id=user_id,
-                name="Все",
-                is_default=True
-            )
-            db.add(default_folder)
-            db.flush()  # Используем flush вместо commit, чтобы не нарушать транзакцию
-            db.refresh(default_folder)
-            was_created = True
-            if commit_if_new:
-                db.commit()
-        
-        if default_folder is None:
-            raise ValueError(f"Не удалось создать или получить папку 'Все' для пользователя {user_id}")
-        
-        return default_folder, was_created
-    except Exception as e:
-        logger.error(f"Ошибка в _get_or_create_default_folder: {e}")
-        raise
+def _folder_counts(db: Session, user_id: int) -> Dict[int | None, Tuple[int, int, int]]:
+    """(заметок, избранных, дедлайнов) по folder_id одним сгруппированным запросом"""
+    rows = db.query(
+        Note.folder_id,
+        func.count(Note.id),
+        func.coalesce(func.sum(case((Note.is_favorite == True, 1), else_=0)), 0),
+        func.count(Deadline.id),
+    ).outerjoin(
+        Deadline, Deadline.note_id == Note.id
+    ).filter(
+        Note.user_id == user_id
+    ).group_by(Note.folder_id).all()
+    return {folder_id: (notes, favorites, deadlines) for folder_id, notes, favorites, deadlines in rows}
+
 
+@router.get("/folders", response_model=List[FolderOut] | List[FolderCountsOut])
+def list_folders(
+    with_counts: bool = False,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    cache: CachedList = Depends(list_etag),
+):
+    """Папки пользователя, папка "Все" первая.
 
-@router.get("/folders", response_model=List[FolderOut])
-def list_folders(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    # Убеждаемся что папка "Все" существует
-    _, was_created = _get_or_create_default_folder(db, user.id, commit_if_new=True)
+    with_counts=1 добавляет к папкам число заметок, избранных заметок и дедлайнов;
+    у папки "Все" - итоги по всем заметкам пользователя.
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
     
     folders = db.query(Folder).filter(
         Folder.user_id == user.id
     ).order_by(Folder.is_default.desc(), Folder.created_at.asc()).all()
     
+    if not with_counts:
+        return cache.store([folder_to_out(f) for f in folders])
+    
+    counts = _folder_counts(db, user.id)
+    # Папка "Все" показывает все заметки, включая заметки без папки
+    total = tuple(map(sum, zip(*counts.values()))) if counts else (0, 0, 0)
     result = []
-    for f in folders:
-        result.append(FolderOut(
-            id=f.id,
-            name=f.name,
-            is_default=f.is_default,
-            created_at=f.created_at.isoformat() if f.created_at else ""
+    for folder in folders:
+        note_count, favorite_count, deadline_count = total if folder.is_default else counts.get(folder.id, (0, 0, 0))
+        result.append(FolderCountsOut(
+            **folder_to_out(folder).model_dump(),
+            note_count=note_count,
+            favorite_count=favorite_count,
+            deadline_count=deadline_count,
         ))
-    return result
+    return cache.store(result)
 
 
-@router.post("/folders", response_model=FolderOut)
-def create_folder(payload: FolderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _create_folder(db: Session, user_id: int, payload: FolderCreate) -> FolderOut:
+    """Создает папку без коммита"""
     folder = Folder(
-        user_id=user.id,
+        user_id=user_id,
         name=payload.name,
         is_default=False
     )
     
+    mark_changed(db, user_id, folder)
     db.add(folder)
-    db.commit()
-    db.refresh(folder)
+    db.flush()
+    db.refresh(folder)  # created_at задается в БД
     
-    return FolderOut(
-        id=folder.id,
-        name=folder.name,
-        is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
-    )
+    return folder_to_out(folder)
 
 
-@router.patch("/folders/{folder_id}", response_model=FolderOut)
-def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+@router.post("/folders", response_model=FolderOut)
+def create_folder(payload: FolderCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    result = _create_folder(db, user.id, payload)
+    db.commit()
+    return result
+
+
+def _update_folder(db: Session, user_id: int, folder_id: int, payload: FolderUpdate) -> FolderOut:
+    """Переименовывает папку без коммита"""
     folder = db.query(Folder).filter(
         Folder.id == folder_id,
-        Folder.user_id == user.id
+        Folder.user_id == user_id
     ).first()
     
     if folder is None:
@@ -316,22 +393,22 @@ def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(g
     if payload.name is not None:
         folder.name = payload.name
     
+    mark_changed(db, user_id, folder)
+    return folder_to_out(folder)
+
+
+@router.patch("/folders/{folder_id}", response_model=FolderOut)
+def update_folder(folder_id: int, payload: FolderUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    result = _update_folder(db, user.id, folder_id, payload)
     db.commit()
-    db.refresh(folder)
-    
-    return FolderOut(
-        id=folder.id,
-        name=folder.name,
-        is_default=folder.is_default,
-        created_at=folder.created_at.isoformat() if folder.created_at else ""
-    )
+    return result
 
 
-@router.delete("/folders/{folder_id}")
-def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+def _delete_folder(db: Session, user_id: int, folder_id: int) -> None:
+    """Удаляет папку без коммита, ее заметки переносятся в папку "Все"."""
     folder = db.query(Folder).filter(
         Folder.id == folder_id,
-        Folder.user_id == user.id
+        Folder.user_id == user_id
     ).first()
     
     if folder is None:
@@ -341,156 +418,232 @@ def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(ge
         raise HTTPException(status_code=400, detail="Нельзя удалить папку 'Все'")
     
     # Перемещаем заметки из удаляемой папки в папку "Все"
-    default_folder, _ = _get_or_create_default_folder(db, user.id, commit_if_new=True)
-    db.query(Note).filter(Note.folder_id == folder_id).update({Note.folder_id: default_folder.id})
+    db.query(Note).filter(Note.folder_id == folder_id).update({
+        Note.folder_id: get_or_create_default_folder_id(db, user_id),
+        Note.change_seq: change_seq(db, user_id),
+    })
     
+    mark_deleted(db, user_id, "folder", folder.id)
     db.delete(folder)
+
+
+@router.delete("/folders/{folder_id}")
+def delete_folder(folder_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    _delete_folder(db, user.id, folder_id)
     db.commit()
     return {"ok": True}
 
 
 # Notes
-@router.get("/notes", response_model=List[NoteOut])
-def list_notes(folder_id: int | None = None, tag_id: int | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    try:
-        query = db.query(Note).options(joinedload(Note.tags)).filter(
-            Note.user_id == user.id
+NOTE_PREVIEW_LENGTH = 200  # Длина превью контента в режиме view=summary
+
+
+def _filter_notes(db: Session, query, user_id: int, folder_id: int | None, filter_tags: List[int], mode: str):
+    """Применяет к запросу заметок фильтры пользователя, папки и тегов"""
+    query = query.filter(Note.user_id == user_id)
+    
+    # Папка "Все" показывает все заметки пользователя, остальные - только свои.
+    # id папки "Все" берется из памяти, запрос к folders - только проверка чужой
+    # или несуществующей папки
+    if folder_id is not None and folder_id != default_folder_id(db, user_id):
+        exists = db.query(Folder.id).filter(Folder.id == folder_id, Folder.user_id == user_id).first()
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Папка не найдена")
+        query = query.filter(Note.folder_id == folder_id)
+    
+    # Фильтр по тегам
+    if filter_tags:
+        query = query.filter(_tag_filter(db, user_id, Note.id, True, filter_tags, mode))
+    
+    return query
+
+
+def _load_note(db: Session, note_id: int, user_id: int) -> Tuple[Note, List[int]]:
+    """Заметка и id ее тегов одним запросом"""
+    row = db.query(
+        Note,
+        tag_ids(note_tag, "note_id", Note.id)
+    ).filter(
+        Note.id == note_id,
+        Note.user_id == user_id
+    ).first()
+    
+    if row is None:
+        raise HTTPException(status_code=404, detail="Заметка не найдена")
+    return row[0], parse_tag_ids(row[1])
+
+
+def _note_summary_columns():
+    """Колонки режима view=summary: вид заметки и счетчики todo хранятся в notes, превью - срез content"""
+    is_todo = Note.note_kind == NOTE_KIND_TODO
+    return [
+        is_todo.label("is_todo"),
+        case((is_todo, null()), else_=func.substr(Note.content, 1, NOTE_PREVIEW_LENGTH)).label("content_preview"),
+        Note.todo_total.label("todo_total"),
+        Note.todo_done.label("todo_done"),
+        Note.has_deadline_notifications.label("has_deadline_notifications"),
+    ]
+
+
+def _summary_overlay(pending: dict) -> dict:
+    """Поля NoteSummaryOut из несохраненных правок заметки (см. _note_summary_columns)"""
+    overlay = {"title": pending["title"]} if "title" in pending else {}
+    if "content" in pending:
+        content = pending["content"]
+        note_kind, todo_total, todo_done = todo_stats(content)
+        is_todo = note_kind == NOTE_KIND_TODO
+        overlay.update(
+            is_todo=is_todo,
+            content_preview=None if is_todo or content is None else content[:NOTE_PREVIEW_LENGTH],
+            todo_total=todo_total,
+            todo_done=todo_done,
         )
-        
-        # Если folder_id указан, проверяем, является ли это папкой "Все"
-        # Если это папка "Все" (is_default=True), показываем все заметки пользователя
-        # Иначе фильтруем по папке
-        if folder_id is not None:
-            folder = db.query(Folder).filter(
-                Folder.id == folder_id,
-                Folder.user_id == user.id
-            ).first()
-            
-            # Если папка существует и это не папка "Все", фильтруем по папке
-            # Если это папка "Все" (is_default=True), не фильтруем - показываем все заметки
-            if folder and not folder.is_default:
-                query = query.filter(Note.folder_id == folder_id)
-            # Если folder не найдена или это папка "Все", не фильтруем по folder_id
-        
-        # Фильтр по тегу
-        if tag_id is not None:
-            # Используем exists для более надежной фильтрации
-            from sqlalchemy import exists
-            query = query.filter(
-                exists().where(
-                    (note_tag.c.note_id == Note.id) & 
-                    (note_tag.c.tag_id == tag_id)
-                )
+    return overlay
+
+
+def _list_note_summaries(db: Session, user_id: int, query, sort_columns: list, paginated: bool, limit: int | None, cursor: str | None):
+    """Облегченный список заметок без полного content"""
+    if paginated:
+        rows, next_cursor = fetch_page(query, sort_columns, limit, cursor)
+    else:
+        rows = query.all()
+    
+    note_ids = [row.id for row in rows]
+    
+    # Теги всей страницы: один запрос по note_tag, имена и цвета из словаря тегов
+    tags_by_note = note_tags(db, note_ids)
+    pending = note_write_buffer.user_pending(user_id)
+    
+    result = [
+        NoteSummaryOut(
+            id=row.id,
+            title=row.title,
+            folder_id=row.folder_id,
+            is_favorite=row.is_favorite,
+            tags=tags_by_note.get(row.id, []),
+            has_deadline_notifications=row.has_deadline_notifications,
+            is_todo=bool(row.is_todo),
+            content_preview=row.content_preview,
+            todo_total=row.todo_total,
+            todo_done=row.todo_done,
+        )
+        for row in rows
+    ]
+    if pending:
+        result = [
+            item.model_copy(update=_summary_overlay(pending[item.id])) if item.id in pending else item
+            for item in result
+        ]
+    
+    if not paginated:
+        return result
+    return NoteSummaryPage(items=result, next_cursor=next_cursor)
+
+
+@router.get("/notes", response_model=List[NoteOut] | NotePage | List[NoteSummaryOut] | NoteSummaryPage)
+def list_notes(
+    folder_id: int | None = None,
+    tag_id: int | None = None,
+    tag_ids: str | None = None,
+    mode: Literal["any", "all"] = MODE_ANY,
+    view: Literal["full", "summary"] = "full",
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    cache: CachedList = Depends(list_etag),
+):
+    """Список заметок пользователя.
+
+    Без limit/cursor возвращает все заметки списком (поведение для старых клиентов).
+    С limit или cursor возвращает страницу {items, next_cursor} с keyset-пагинацией
+    по (is_favorite desc, updated_at desc, id desc).
+    view=summary отдает вместо content превью и счетчики todo; полную заметку
+    клиент получает через GET /api/notes/{note_id}.
+    tag_ids=1,2,3 оставляет заметки с любым (mode=any) или со всеми (mode=all) тегами;
+    tag_id - прежний фильтр по одному тегу.
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    filter_tags = _parse_tag_filter(tag_id, tag_ids)
+    
+    paginated = limit is not None or cursor is not None
+    sort_columns = [Note.is_favorite, raw_text(Note.updated_at), Note.id]
+    order_by = (Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc())
+    try:
+        if view == "summary":
+            query = db.query(
+                Note.id, Note.title, Note.folder_id, *_note_summary_columns(), *sort_columns
             )
+            query = _filter_notes(db, query, user.id, folder_id, filter_tags, mode).order_by(*order_by)
+            return cache.store(_list_note_summaries(db, user.id, query, sort_columns, paginated, limit, cursor))
         
-        # Сортируем: сначала избранные (только одна), потом по дате обновления
-        notes = query.order_by(Note.is_favorite.desc(), Note.updated_at.desc()).all()
-        
-        # Получаем все дедлайны с включенными уведомлениями для заметок пользователя
-        note_ids = [n.id for n in notes]
-        deadlines_with_notifications = {}
-        if note_ids:
-            deadlines = db.query(Deadline).filter(
-                Deadline.note_id.in_(note_ids),
-                Deadline.notification_enabled == True
-            ).all()
-            for deadline in deadlines:
-                deadlines_with_notifications[deadline.note_id] = True
+        # JSON каждой заметки собирается в SQL, ORM-объекты не создаются
+        query = db.query(note_json(), *sort_columns)
+        query = _filter_notes(db, query, user.id, folder_id, filter_tags, mode)
         
-        result = []
-        for n in notes:
-            try:
-                # Явно преобразуем теги, обрабатывая возможные ошибки
-                tags_list = []
-                if n.tags:
-                    for tag in n.tags:
-                        try:
-                            tags_list.append(TagOut(id=tag.id, name=tag.name, color=tag.color))
-                        except Exception as tag_error:
-                            logger.error(f"Ошибка обработки тега {tag.id}: {tag_error}")
-                            continue
-                
-                # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-                has_deadline_notifications = deadlines_with_notifications.get(n.id, False)
-                
-                result.append(NoteOut(
-                    id=n.id,
-                    title=n.title,
-                    content=n.content,
-                    folder_id=n.folder_id,
-                    is_favorite=n.is_favorite if hasattr(n, 'is_favorite') else False,
-                    tags=tags_list,
-                    has_deadline_notifications=has_deadline_notifications
-                ))
-            except Exception as note_error:
-                logger.error(f"Ошибка обработки заметки {n.id}: {note_error}")
-                continue
+        # Сортируем: сначала избранные (только одна), потом по дате обновления
+        query = query.order_by(*order_by)
+        if paginated:
+            rows, next_cursor = fetch_page(query, sort_columns, limit, cursor)
+        else:
+            rows = query.all()
         
-        return result
+        # Последняя колонка строки - Note.id (sort_columns)
+        pending = note_write_buffer.user_pending(user.id)
+        items = [overlay_note_json(row[0], pending[row[-1]]) if row[-1] in pending else row[0] for row in rows]
+        if not paginated:
+            return cache.store_body(json_array_body(items))
+        return cache.store_body(json_page_body(items, next_cursor))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка в list_notes: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка при получении заметок: {str(e)}")
 
 
+def _create_note(db: Session, user_id: int, payload: NoteCreate) -> NoteOut:
+    """Создает заметку без коммита (общая часть POST /notes и /batch)"""
+    # Если folder_id не указан, используем папку "Все"
+    folder_id = payload.folder_id
+    if folder_id is None:
+        folder_id = get_or_create_default_folder_id(db, user_id)
+    else:
+        # Проверяем, что папка существует и принадлежит пользователю
+        folder = db.query(Folder).filter(
+            Folder.id == folder_id,
+            Folder.user_id == user_id
+        ).first()
+        if folder is None:
+            raise HTTPException(status_code=404, detail="Папка не найдена")
+    
+    note = Note(
+        user_id=user_id,
+        folder_id=folder_id,
+        title=payload.title,
+        content=payload.content
+    )
+    
+    mark_changed(db, user_id, note)
+    db.add(note)
+    db.flush()  # Сохраняем заметку чтобы получить ID
+    
+    # Обрабатываем теги ПОСЛЕ добавления заметки в сессию
+    tags = []
+    if payload.tags_text:
+        tag_names = extract_hashtags(payload.tags_text)
+        tags = _update_tags_for_item(db, user_id, note.id, tag_names, [], is_note=True)
+    
+    # У новой заметки еще нет дедлайна. Ответ собираем до коммита (см. _create_task)
+    return note_to_out(note, tags)
+
+
 @router.post("/notes", response_model=NoteOut)
 def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
     try:
-        # Если folder_id не указан, используем папку "Все"
-        folder_id = payload.folder_id
-        if folder_id is None:
-            default_folder, _ = _get_or_create_default_folder(db, user.id)
-            folder_id = default_folder.id
-        else:
-            # Проверяем, что папка существует и принадлежит пользователю
-            folder = db.query(Folder).filter(
-                Folder.id == folder_id,
-                Folder.user_id == user.id
-            ).first()
-            if folder is None:
-                raise HTTPException(status_code=404, detail="Папка не найдена")
-        
-        note = Note(
-            user_id=user.id,
-            folder_id=folder_id,
-            title=payload.title,
-            content=payload.content
-        )
-        
-        db.add(note)
-        db.flush()  # Сохраняем заметку чтобы получить ID
-        note_id = note.id
-        
-        # Обрабатываем теги ПОСЛЕ добавления заметки в сессию
-        if payload.tags_text:
-            tag_names = _extract_hashtags(payload.tags_text)
-            _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
-        
+        result = _create_note(db, user.id, payload)
         db.commit()
-        
-        # Перезагружаем с тегами
-        note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
-        
-        if note is None:
-            raise HTTPException(status_code=500, detail="Не удалось загрузить созданную заметку")
-        
-        tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-        
-        # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-        deadline = db.query(Deadline).filter(
-            Deadline.note_id == note.id,
-            Deadline.notification_enabled == True
-        ).first()
-        has_deadline_notifications = deadline is not None
-        
-        result = NoteOut(
-            id=note.id,
-            title=note.title,
-            content=note.content,
-            folder_id=note.folder_id,
-            is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
-            tags=tags_list,
-            has_deadline_notifications=has_deadline_notifications
-        )
         return result
     except HTTPException:
         raise
@@ -500,15 +653,10 @@ def create_note(payload: NoteCreate, db: Session = Depends(get_db), user=Depends
         raise HTTPException(status_code=500, detail=f"Ошибка при создании заметки: {str(e)}")
 
 
-@router.patch("/notes/{note_id}", response_model=NoteOut)
-def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    note = db.query(Note).options(joinedload(Note.tags)).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
+def _update_note(db: Session, user_id: int, note_id: int, payload: NoteUpdate) -> NoteOut:
+    """Обновляет заметку без коммита"""
+    note, current_tag_ids = _load_note(db, note_id, user_id)
+    note_write_buffer.claim(db, note)
     
     # Обновляем поля
     # Используем exclude_unset=True, чтобы обновлять только переданные поля (включая None)
@@ -523,45 +671,101 @@ def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db)
     
     # Обновляем теги (если tags_text был передан, даже если это пустая строка)
     if 'tags_text' in payload_dict:
-        tag_names = _extract_hashtags(payload_dict['tags_text'] or '')
-        _update_tags_for_item(db, note, tag_names, note_id, is_note=True)
+        tag_names = extract_hashtags(payload_dict['tags_text'] or '')
+        tags = _update_tags_for_item(db, user_id, note_id, tag_names, current_tag_ids, is_note=True)
+    else:
+        tags = tag_cache.resolve(db, current_tag_ids)
     
+    mark_changed(db, user_id, note)
+    return note_to_out(note, tags)
+
+
+def _buffer_note_update(db: Session, user_id: int, note_id: int, payload: NoteUpdate) -> NoteOut | None:
+    """Откладывает автосохранение (title, content и прежний набор хэштегов) в буфер записи.
+
+    None - обновление нужно записать сразу: меняются другие поля или теги, либо буфер заполнен.
+    """
+    payload_dict = payload.dict(exclude_unset=True)
+    if not set(payload_dict) <= {*BUFFERED_FIELDS, 'tags_text'}:
+        return None
+    note, current_tag_ids = _load_note(db, note_id, user_id)
+    tags = tag_cache.resolve(db, current_tag_ids)
+    if 'tags_text' in payload_dict and extract_hashtags(payload_dict['tags_text'] or '') != {tag.name for tag in tags}:
+        return None
+    fields = {name: payload_dict[name] for name in BUFFERED_FIELDS if name in payload_dict}
+    if fields and note_write_buffer.put(user_id, note_id, fields) is None:
+        return None
+    return note_to_out(note, tags).model_copy(update=note_write_buffer.pending(note_id) or {})
+
+
+@router.patch("/notes/{note_id}", response_model=NoteOut)
+def update_note(note_id: int, payload: NoteUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    if note_write_buffer.enabled:
+        result = _buffer_note_update(db, user.id, note_id, payload)
+        if result is not None:
+            return result
+    result = _update_note(db, user.id, note_id, payload)
     db.commit()
+    return result
+
+
+def _patch_note(db: Session, user_id: int, note_id: int, payload: NoteDelta) -> NoteOut:
+    """Применяет дельту к заметке без коммита"""
+    note, current_tag_ids = _load_note(db, note_id, user_id)
+    # Дельта посчитана от содержимого с отложенными правками (их отдает GET)
+    note_write_buffer.claim(db, note)
+    if not note_write_buffer.is_current_version(note.id, payload.base_version, note.change_seq):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Заметка изменена: дельта посчитана от устаревшей версии {payload.base_version}"
+        )
     
-    # Перезагружаем с тегами
-    note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
+    try:
+        content = apply_note_delta(note.content, payload.ops)
+    except NoteDeltaConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except NoteDeltaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Присваиваем только изменившиеся поля: иначе UPDATE пересчитывал бы todo-статистику
+    if content != note.content:
+        note.content = content
+    if payload.title is not None and payload.title != note.title:
+        note.title = payload.title
     
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
+    if payload.tags_text is not None:
+        tags = _update_tags_for_item(db, user_id, note_id, extract_hashtags(payload.tags_text), current_tag_ids, is_note=True)
+        tags_changed = {tag.id for tag in tags} != set(current_tag_ids)
+    else:
+        tags = tag_cache.resolve(db, current_tag_ids)
+        tags_changed = False
     
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note_id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite if hasattr(note, 'is_favorite') else False,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    # Пустая дельта (автосохранение без правок) не создает новую версию
+    if db.is_modified(note) or tags_changed:
+        mark_changed(db, user_id, note)
+    return note_to_out(note, tags)
+
+
+@router.patch("/notes/{note_id}/delta", response_model=NoteOut)
+def patch_note(note_id: int, payload: NoteDelta, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Изменение заметки дельтой вместо полного content.
+
+    base_version - version заметки, от которой посчитаны операции; если заметку
+    с тех пор изменили, ответ 409 и клиенту нужно перечитать ее. ops - правки
+    текста (text) и операции JSON Patch над todo-пунктами, применяются по
+    порядку. tags_text можно передавать при каждом сохранении: связи с тегами
+    переписываются, только если изменился набор хэштегов. В ответе - новая version.
+    """
+    result = _patch_note(db, user.id, note_id, payload)
+    db.commit()
+    return result
 
 
 @router.post("/notes/{note_id}/favorite", response_model=NoteOut)
 def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
     """Устанавливает заметку в избранное. Если заметка уже в избранном, снимает её. 
     Если устанавливается новая заметка в избранное, старая автоматически снимается."""
-    note = db.query(Note).filter(
-        Note.id == note_id,
-        Note.user_id == user.id
-    ).first()
-    
-    if note is None:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
+    note, current_tag_ids = _load_note(db, note_id, user.id)
     
     # Если заметка уже в избранном, просто снимаем её
     if note.is_favorite:
@@ -578,155 +782,85 @@ def toggle_favorite_note(note_id: int, db: Session = Depends(get_db), user=Depen
         db.query(Note).filter(
             Note.user_id == user.id,
             Note.is_favorite == True
-        ).update({"is_favorite": False})
+        ).update({"is_favorite": False, "change_seq": change_seq(db, user.id)})
         # Устанавливаем текущую заметку в избранное
         note.is_favorite = True
         # При установке в избранное НЕ обновляем updated_at,
         # чтобы заметка сохраняла свою позицию
     
+    mark_changed(db, user.id, note)
+    result = note_to_out(note, tag_cache.resolve(db, current_tag_ids))
     db.commit()
-    
-    # Перезагружаем с тегами для ответа
-    note = db.query(Note).options(joinedload(Note.tags)).filter(Note.id == note_id).first()
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
-    
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note_id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    return result
 
 
 @router.get("/notes/favorite", response_model=NoteOut | None)
-def get_favorite_note(db: Session = Depends(get_db), user=Depends(get_current_user)):
+def get_favorite_note(db: Session = Depends(get_db), user=Depends(get_current_user), cache: CachedList = Depends(list_etag)):
     """Получает избранную заметку пользователя"""
-    note = db.query(Note).options(joinedload(Note.tags)).filter(
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
+    row = db.query(
+        Note,
+        tag_ids(note_tag, "note_id", Note.id)
+    ).filter(
         Note.user_id == user.id,
         Note.is_favorite == True
     ).first()
     
-    if note is None:
-        return None
-    
-    tags_list = [TagOut(id=tag.id, name=tag.name, color=tag.color) for tag in (note.tags or [])]
+    if row is None:
+        return cache.store(None)
     
-    # Проверяем, есть ли у заметки дедлайн с включенными уведомлениями
-    deadline = db.query(Deadline).filter(
-        Deadline.note_id == note.id,
-        Deadline.notification_enabled == True
-    ).first()
-    has_deadline_notifications = deadline is not None
-    
-    return NoteOut(
-        id=note.id,
-        title=note.title,
-        content=note.content,
-        folder_id=note.folder_id,
-        is_favorite=note.is_favorite,
-        tags=tags_list,
-        has_deadline_notifications=has_deadline_notifications
-    )
+    note, current_tag_ids = row
+    result = note_to_out(note, tag_cache.resolve(db, parse_tag_ids(current_tag_ids)))
+    pending = note_write_buffer.pending(note.id)
+    return cache.store(result.model_copy(update=pending) if pending else result)
+
+
+@router.get("/notes/{note_id}", response_model=NoteOut)
+def get_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Получает заметку целиком (используется вместе со списком view=summary)"""
+    note, current_tag_ids = _load_note(db, note_id, user.id)
+    result = note_to_out(note, tag_cache.resolve(db, current_tag_ids))
+    pending = note_write_buffer.pending(note_id)
+    return result.model_copy(update=pending) if pending else result
+
+
+def _delete_note(db: Session, user_id: int, note_id: int) -> None:
+    """Удаляет заметку (и ее дедлайн) без коммита"""
+    note, current_tag_ids = _load_note(db, note_id, user_id)
+    note_write_buffer.claim(db, note)
+    mark_deleted(db, user_id, "note", note.id)
+    if note.deadline is not None:
+        # Дедлайн удаляется каскадно вместе с заметкой
+        mark_deleted(db, user_id, "deadline", note.deadline.id)
+    db.delete(note)
+    adjust_tag_usage(db, user_id, [], current_tag_ids, is_note=True)
+    tag_index.record(db, user_id, True, note_id, [], current_tag_ids)
 
 
 @router.delete("/notes/{note_id}")
 def delete_note(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    note = db.get(Note, note_id)
-    if note is None or note.user_id != user.id:
-        raise HTTPException(status_code=404, detail="Заметка не найдена")
-    db.delete(note)
+    _delete_note(db, user.id, note_id)
     db.commit()
     return {"ok": True}
 
 
 # Deadlines
-def _is_todo_note(content: str | None) -> bool:
-    """Проверяет, является ли заметка todo-заметкой."""
-    if not content:
-        return False
-    try:
-        parsed = json.loads(content)
-        return parsed.get("type") == "todo" and isinstance(parsed.get("items"), list)
-    except:
-        return False
-
-
-def _calculate_deadline_info(deadline_at: datetime) -> dict:
-    """Вычисляет информацию о дедлайне (оставшееся время, статус, текст)."""
-    # Приводим deadline_at к timezone-aware datetime
-    if deadline_at.tzinfo is None:
-        deadline_at = deadline_at.replace(tzinfo=timezone.utc)
-    
-    now = datetime.now(timezone.utc)
-    time_until = deadline_at - now
-    total_seconds = int(time_until.total_seconds())
-    total_minutes = total_seconds // 60
-    total_hours = total_minutes // 60
-    days_remaining = total_hours // 24
-    
-    if total_seconds < 0:
-        status = "overdue"
-        time_remaining_text = "просрочен"
-        days_remaining = 0
-    elif days_remaining == 0 and total_hours < 24:
-        if total_hours == 0:
-            status = "today"
-            time_remaining_text = "сегодня"
-        else:
-            status = "today"
-            remaining_mins = total_minutes % 60
-            if remaining_mins > 0:
-                time_remaining_text = f"сегодня ({total_hours} ч. {remaining_mins} мин.)"
-            else:
-                time_remaining_text = f"сегодня ({total_hours} ч.)"
-    else:
-        status = "active"
-        remaining_hours = total_hours % 24
-        remaining_mins = total_minutes % 60
-        
-        if days_remaining == 1:
-            time_remaining_text = "1 день"
-        elif 2 <= days_remaining <= 4:
-            time_remaining_text = f"{days_remaining} дня"
-        else:
-            time_remaining_text = f"{days_remaining} дней"
-        
-        if remaining_hours > 0:
-            time_remaining_text += f" {remaining_hours} {'час' if remaining_hours == 1 else 'часа' if 2 <= remaining_hours <= 4 else 'часов'}"
-        if remaining_mins > 0:
-            time_remaining_text += f" {remaining_mins} {'минута' if remaining_mins == 1 else 'минуты' if 2 <= remaining_mins <= 4 else 'минут'}"
-    
-    return {
-        "days_remaining": days_remaining,
-        "status": status,
-        "time_remaining_text": time_remaining_text
-    }
-
-
-@router.post("/deadlines", response_model=DeadlineOut)
-def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Создает дедлайн для заметки. Заметка должна быть todo-заметкой."""
+def _create_deadline(db: Session, user_id: int, payload: DeadlineCreate) -> DeadlineOut:
+    """Создает дедлайн без коммита (общая часть POST /deadlines и /batch)"""
     # Проверяем, что заметка существует и принадлежит пользователю
     note = db.query(Note).filter(
         Note.id == payload.note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
         raise HTTPException(status_code=404, detail="Заметка не найдена")
     
     # Проверяем, что заметка является todo
-    if not _is_todo_note(note.content):
+    if note.note_kind != NOTE_KIND_TODO:
         raise HTTPException(status_code=400, detail="Дедлайн можно создать только для todo-заметок")
     
     # Проверяем, нет ли уже дедлайна для этой заметки
@@ -752,55 +886,139 @@ def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user
     # Создаем дедлайн
     deadline = Deadline(
         note_id=payload.note_id,
-        user_id=user.id,
+        user_id=user_id,
         deadline_at=deadline_at,
         notification_enabled=False
     )
     
+    # Заметка тоже меняется: от дедлайна зависит ее has_deadline_notifications
+    # (у нового дедлайна уведомления выключены)
+    note.has_deadline_notifications = False
+    mark_changed(db, user_id, deadline, note)
     db.add(deadline)
-    db.commit()
+    db.flush()
     db.refresh(deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return deadline_to_out(deadline)
 
 
-@router.get("/deadlines", response_model=List[DeadlineOut])
-def get_all_deadlines(db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Получает все дедлайны пользователя."""
-    # Получаем все дедлайны пользователя
-    deadlines = db.query(Deadline).filter(Deadline.user_id == user.id).all()
-    
-    # Вычисляем информацию о каждом дедлайне
-    result = []
-    for deadline in deadlines:
-        info = _calculate_deadline_info(deadline.deadline_at)
-        result.append(DeadlineOut(
-            id=deadline.id,
-            note_id=deadline.note_id,
-            deadline_at=deadline.deadline_at.isoformat(),
-            notification_enabled=deadline.notification_enabled,
-            days_remaining=info["days_remaining"],
-            status=info["status"],
-            time_remaining_text=info["time_remaining_text"]
-        ))
-    
+@router.post("/deadlines", response_model=DeadlineOut)
+def create_deadline(payload: DeadlineCreate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Создает дедлайн для заметки. Заметка должна быть todo-заметкой."""
+    result = _create_deadline(db, user.id, payload)
+    db.commit()
     return result
 
 
+def _parse_window_bound(value: str | None) -> datetime | None:
+    """Граница периода from/to: в БД дедлайны хранятся в UTC без часового пояса"""
+    if not value:
+        return None
+    try:
+        bound = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Неверный формат даты: {e}")
+    if bound.tzinfo is not None:
+        bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+    return bound
+
+
+def _deadline_window(status: str | None, date_from: datetime | None, date_to: datetime | None) -> list:
+    """Условия на deadline_at для периода [from, to) и статуса.
+
+    Статус задается тем же окном, что и в calculate_deadline_info: overdue - уже
+    прошел, today - в ближайшие 24 часа, active - позже.
+    """
+    conditions = []
+    if date_from is not None:
+        conditions.append(Deadline.deadline_at >= date_from)
+    if date_to is not None:
+        conditions.append(Deadline.deadline_at < date_to)
+    if status is not None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        day_later = now + DEADLINE_TODAY_WINDOW
+        if status == "overdue":
+            conditions.append(Deadline.deadline_at < now)
+        elif status == "today":
+            conditions.append(Deadline.deadline_at >= now)
+            conditions.append(Deadline.deadline_at < day_later)
+        else:
+            conditions.append(Deadline.deadline_at >= day_later)
+    return conditions
+
+
+@router.get("/deadlines", response_model=List[DeadlineAgendaOut] | DeadlinePage)
+def get_all_deadlines(
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    status: Literal["overdue", "today", "active"] | None = None,
+    deadline_mode: Literal["relative", "absolute"] = DEADLINE_MODE_RELATIVE,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    cache: CachedList = Depends(deadlines_etag),
+):
+    """Дедлайны пользователя с заголовками заметок, по возрастанию deadline_at.
+
+    from/to (ISO 8601) ограничивают период [from, to), status оставляет только
+    просроченные, сегодняшние (ближайшие 24 часа) или более поздние дедлайны.
+    Просроченные сортируются от последнего к более ранним.
+    deadline_mode=absolute отдает только даты (deadline_at, today_from) без
+    оставшегося времени: такой ответ меняется только вместе с данными, а часы
+    сервера приходят в заголовке X-Server-Time.
+    Без limit/cursor возвращает список целиком, с ними - страницу
+    {items, next_cursor} с keyset-пагинацией по (deadline_at, id).
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
+    paginated = limit is not None or cursor is not None
+    conditions = _deadline_window(status, _parse_window_bound(date_from), _parse_window_bound(date_to))
+    descending = status == "overdue"
+    sort_columns = [raw_text(Deadline.deadline_at), Deadline.id]
+    order_by = (Deadline.deadline_at.desc(), Deadline.id.desc()) if descending else (Deadline.deadline_at, Deadline.id)
+    
+    # Фильтр и сортировка по индексу (user_id, deadline_at, id), заголовок заметки - тем же запросом
+    query = db.query(Deadline, Note.title, *sort_columns).join(
+        Note, Note.id == Deadline.note_id
+    ).filter(
+        Deadline.user_id == user.id, *conditions
+    ).order_by(*order_by)
+    if paginated:
+        rows, next_cursor = fetch_page(query, sort_columns, limit, cursor, descending)
+    else:
+        rows = query.all()
+    
+    # Оставшееся время и статус считаются только для строк ответа; заголовок
+    # заметки может ждать записи в буфере
+    pending = note_write_buffer.user_pending(user.id)
+    items = [
+        DeadlineAgendaOut(
+            **deadline_to_out(deadline, deadline_mode).model_dump(),
+            note_title=pending.get(deadline.note_id, {}).get("title", title),
+        )
+        for deadline, title, *_ in rows
+    ]
+    if not paginated:
+        return cache.store(items)
+    return cache.store(DeadlinePage(items=items, next_cursor=next_cursor))
+
+
 @router.get("/deadlines/{note_id}", response_model=DeadlineOut)
-def get_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Получает дедлайн для заметки."""
+def get_deadline(
+    note_id: int,
+    deadline_mode: Literal["relative", "absolute"] = DEADLINE_MODE_RELATIVE,
+    db: Session = Depends(get_db),
+    user=Depends(get_current_user),
+    cache: CachedList = Depends(deadlines_etag),
+):
+    """Получает дедлайн для заметки (deadline_mode - как у GET /api/deadlines)."""
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
     # Проверяем, что заметка существует и принадлежит пользователю
     note = db.query(Note).filter(
         Note.id == note_id,
@@ -816,27 +1034,15 @@ def get_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_c
     if deadline is None:
         raise HTTPException(status_code=404, detail="Дедлайн не найден")
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return cache.store(deadline_to_out(deadline, deadline_mode))
 
 
-@router.patch("/deadlines/{note_id}", response_model=DeadlineOut)
-def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Обновляет дедлайн для заметки."""
+def _update_deadline(db: Session, user_id: int, note_id: int, payload: DeadlineUpdate) -> DeadlineOut:
+    """Обновляет дедлайн заметки без коммита"""
     # Проверяем, что заметка существует и принадлежит пользователю
     note = db.query(Note).filter(
         Note.id == note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
@@ -898,30 +1104,28 @@ def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends
                 DeadlineNotification.notification_type != "expired"
             ).delete(synchronize_session=False)
     
-    db.commit()
+    note.has_deadline_notifications = deadline.notification_enabled
+    mark_changed(db, user_id, deadline, note)
+    db.flush()
     db.refresh(deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return deadline_to_out(deadline)
 
 
-@router.delete("/deadlines/{note_id}")
-def delete_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
-    """Удаляет дедлайн для заметки."""
+@router.patch("/deadlines/{note_id}", response_model=DeadlineOut)
+def update_deadline(note_id: int, payload: DeadlineUpdate, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Обновляет дедлайн для заметки."""
+    result = _update_deadline(db, user.id, note_id, payload)
+    db.commit()
+    return result
+
+
+def _delete_deadline(db: Session, user_id: int, note_id: int) -> None:
+    """Удаляет дедлайн заметки без коммита"""
     # Проверяем, что заметка существует и принадлежит пользователю
     note = db.query(Note).filter(
         Note.id == note_id,
-        Note.user_id == user.id
+        Note.user_id == user_id
     ).first()
     
     if note is None:
@@ -933,7 +1137,16 @@ def delete_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(ge
     if deadline is None:
         raise HTTPException(status_code=404, detail="Дедлайн не найден")
     
+    mark_deleted(db, user_id, "deadline", deadline.id)
+    note.has_deadline_notifications = False
+    mark_changed(db, user_id, note)
     db.delete(deadline)
+
+
+@router.delete("/deadlines/{note_id}")
+def delete_deadline(note_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Удаляет дедлайн для заметки."""
+    _delete_deadline(db, user.id, note_id)
     db.commit()
     return {"ok": True}
 
@@ -968,21 +1181,12 @@ def toggle_deadline_notifications(note_id: int, db: Session = Depends(get_db), u
             DeadlineNotification.notification_type != "expired"
         ).delete(synchronize_session=False)
     
+    note.has_deadline_notifications = deadline.notification_enabled
+    mark_changed(db, user.id, deadline, note)
     db.commit()
     db.refresh(deadline)
     
-    # Вычисляем информацию о дедлайне
-    info = _calculate_deadline_info(deadline.deadline_at)
-    
-    return DeadlineOut(
-        id=deadline.id,
-        note_id=deadline.note_id,
-        deadline_at=deadline.deadline_at.isoformat(),
-        notification_enabled=deadline.notification_enabled,
-        days_remaining=info["days_remaining"],
-        status=info["status"],
-        time_remaining_text=info["time_remaining_text"]
-    )
+    return deadline_to_out(deadline)
 
 
 @router.post("/deadlines/{note_id}/notifications/test")
@@ -1082,3 +1286,120 @@ def test_deadline_notification(note_id: int, db: Session = Depends(get_db), user
         
         # Возвращаем ошибку с понятным сообщением
         raise HTTPException(status_code=400, detail=user_message)
+
+
+# Batch
+IDEMPOTENCY_KEY_TTL = timedelta(days=7)  # Сколько хранится результат операции с ключом идемпотентности
+
+_BATCH_CREATE = {
+    "note": (NoteCreate, _create_note),
+    "task": (TaskCreate, _create_task),
+    "folder": (FolderCreate, _create_folder),
+    "deadline": (DeadlineCreate, _create_deadline),
+}
+_BATCH_UPDATE = {
+    "note": (NoteUpdate, _update_note),
+    "task": (TaskUpdate, _update_task),
+    "folder": (FolderUpdate, _update_folder),
+    "deadline": (DeadlineUpdate, _update_deadline),
+}
+_BATCH_DELETE = {
+    "note": _delete_note,
+    "task": _delete_task,
+    "folder": _delete_folder,
+    "deadline": _delete_deadline,
+}
+
+
+def _apply_batch_operation(db: Session, user_id: int, index: int, operation: BatchOperation) -> BatchResult:
+    """Выполняет одну операцию пакета без коммита"""
+    if operation.op != "create" and operation.id is None:
+        raise HTTPException(status_code=400, detail="Не указан id объекта")
+    
+    if operation.op == "delete":
+        _BATCH_DELETE[operation.entity](db, user_id, operation.id)
+        return BatchResult(index=index, op=operation.op, entity=operation.entity, id=operation.id)
+    
+    schema, handler = (_BATCH_CREATE if operation.op == "create" else _BATCH_UPDATE)[operation.entity]
+    try:
+        payload = schema.model_validate(operation.data or {})
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        raise HTTPException(status_code=422, detail=f"Неверные данные ({errors})")
+    
+    if operation.op == "create":
+        data = handler(db, user_id, payload)
+    else:
+        data = handler(db, user_id, operation.id, payload)
+    # Дедлайны адресуются по id заметки (как в /deadlines/{note_id})
+    object_id = data.note_id if operation.entity == "deadline" else data.id
+    return BatchResult(index=index, op=operation.op, entity=operation.entity, id=object_id, data=data)
+
+
+@router.post("/batch", response_model=BatchOut)
+def apply_batch(payload: BatchRequest, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Выполняет список операций над заметками, задачами, папками и дедлайнами в одной транзакции.
+    
+    Выполняются либо все операции, либо ни одна: при ошибке транзакция откатывается,
+    а в detail указан номер операции. Операция с уже использованным idempotency_key
+    повторно не выполняется, возвращается сохраненный результат с replayed=true.
+    """
+    keys = {operation.idempotency_key for operation in payload.operations if operation.idempotency_key}
+    stored = {}
+    if keys:
+        stored = dict(db.query(IdempotencyKey.key, IdempotencyKey.result).filter(
+            IdempotencyKey.user_id == user.id,
+            IdempotencyKey.key.in_(keys)
+        ).all())
+    
+    results = []
+    new_keys = []
+    try:
+        for index, operation in enumerate(payload.operations):
+            key = operation.idempotency_key
+            if key and key in stored:
+                result = BatchResult.model_validate_json(stored[key])
+                results.append(result.model_copy(update={"index": index, "replayed": True}))
+                continue
+            
+            try:
+                result = _apply_batch_operation(db, user.id, index, operation)
+                # Ошибки ограничений БД должны указывать на операцию, а не всплыть при коммите
+                db.flush()
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"Операция {index}: {e.detail}")
+            except IntegrityError as e:
+                raise HTTPException(status_code=400, detail=f"Операция {index}: нарушено ограничение БД ({e.orig})")
+            
+            if key:
+                stored[key] = result.model_dump_json()
+                new_keys.append({"user_id": user.id, "key": key, "result": stored[key]})
+            results.append(result)
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка при выполнении пакета операций: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при выполнении пакета операций: {str(e)}")
+    
+    try:
+        if new_keys:
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.user_id == user.id,
+                IdempotencyKey.created_at < datetime.now(timezone.utc) - IDEMPOTENCY_KEY_TTL
+            ).delete(synchronize_session=False)
+            db.execute(insert(IdempotencyKey), new_keys)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        # Ключ уже записан: тот же пакет параллельно выполнил другой запрос
+        if new_keys and db.query(IdempotencyKey.id).filter(
+            IdempotencyKey.user_id == user.id,
+            IdempotencyKey.key.in_([row["key"] for row in new_keys])
+        ).first() is not None:
+            raise HTTPException(status_code=409, detail="Операции с этими ключами идемпотентности уже выполняются")
+        logger.error(f"Ошибка при сохранении пакета операций: {e}")
+        raise HTTPException(status_code=400, detail=f"Пакет операций нарушает ограничение БД ({e.orig})")
+    
+    return BatchOut(results=results)
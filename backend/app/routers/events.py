@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, Header, Request
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..db import SessionLocal
+from ..deps import get_current_user, load_user, user_id_from_token
+from ..models.user import User
+from ..security import SCOPE_EVENTS, create_scoped_token
+from ..services.events import event_broker, format_event
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["events"])
+
+# EventSource в браузере не умеет передавать заголовки, поэтому токен можно
+# передать и параметром access_token. Основной токен в URL попал бы в журналы
+# доступа, поэтому в параметре принимается только короткий токен потока
+# из POST /api/events/token
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+# Через сколько миллисекунд EventSource переподключается после обрыва
+RETRY_MS = 3000
+
+
+def _check_user(user_id: int) -> None:
+    # Короткая сессия только на проверку: поток может быть открыт часами
+    db = SessionLocal()
+    try:
+        load_user(db, user_id)
+    finally:
+        db.close()
+
+
+@router.post("/events/token")
+def events_token(user: User = Depends(get_current_user)):
+    """Короткоживущий токен для подключения к GET /api/events?access_token=...
+
+    Подходит только для потока событий. Нужен в момент подключения: открытый
+    поток не закрывается по его истечении, но при переподключении после ошибки
+    (EventSource получит 401) нужно запросить новый.
+    """
+    return {
+        "token": create_scoped_token(str(user.id), SCOPE_EVENTS, settings.events_token_expire_seconds),
+        "expires_in": settings.events_token_expire_seconds,
+    }
+
+
+@router.get("/events")
+async def events(
+    request: Request,
+    token: str | None = Depends(optional_oauth2_scheme),
+    access_token: str | None = None,
+    last_event_id: str | None = None,
+    last_event_id_header: str | None = Header(None, alias="Last-Event-ID"),
+):
+    """Поток Server-Sent Events с изменениями данных пользователя.
+
+    События: change (изменены заметки, задачи, папки, дедлайны или настройки;
+    data: {"seq", "changes": [{"entity", "id", "deleted"}]}), deadline_status
+    (дедлайн стал today или overdue), reminder (отправлено напоминание),
+    resync (пропущенные события недоступны - нужно перечитать данные, например
+    через GET /api/sync). При переподключении EventSource сам присылает
+    Last-Event-ID, и поток начинается с пропущенных событий.
+    
+    Токен - в заголовке Authorization или, для EventSource, параметром
+    access_token (только токен из POST /api/events/token).
+    """
+    if token:
+        user_id = user_id_from_token(token)
+    else:
+        user_id = user_id_from_token(access_token, scope=SCOPE_EVENTS)
+    await run_in_threadpool(_check_user, user_id)
+
+    resume_from = last_event_id_header or last_event_id
+
+    async def stream():
+        subscription = await run_in_threadpool(
+            event_broker.subscribe, user_id, resume_from, asyncio.get_running_loop()
+        )
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.events_heartbeat_seconds
+                    )
+                except asyncio.TimeoutError:
+                    # Комментарий не дает прокси закрыть соединение по простою
+                    yield ": heartbeat\n\n"
+                    continue
+                yield format_event(event)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
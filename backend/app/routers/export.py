@@ -0,0 +1,116 @@
+import json
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, Tuple
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..deps import get_current_user
+from ..models.todo import Task, Note, Tag, TagUsage, Folder, Deadline
+from ..models.user import User
+from ..projections import note_json, task_json, folder_json, tag_json, deadline_json
+from ..services.sync_service import current_seq
+from ..services.note_write_buffer import note_write_buffer, overlay_note_json
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["export"])
+
+EXPORT_VERSION = 1
+# Сколько строк читать одним запросом
+EXPORT_BATCH_SIZE = 500
+
+
+def _batches(db: Session, row_json, id_column, *conditions) -> Iterator[Tuple[str, int]]:
+    """(JSON, id) строк таблицы пачками по id.
+
+    Каждая пачка - отдельный короткий запрос: открытый курсор SQLite держал бы
+    блокировку чтения все время, пока клиент скачивает выгрузку, и записи других
+    запросов ждали бы его.
+    """
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(row_json, id_column)
+            .where(*conditions, id_column > last_id)
+            .order_by(id_column)
+            .limit(EXPORT_BATCH_SIZE)
+        ).all()
+        yield from rows
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        last_id = rows[-1][1]
+
+
+def export_lines(user_id: int) -> Iterator[bytes]:
+    """Строки NDJSON выгрузки: заголовок, затем папки, теги, заметки, дедлайны и задачи"""
+    db = SessionLocal()
+    # Несохраненные автосохранения из буфера записи выгружаются вместе с заметками
+    pending = note_write_buffer.user_pending(user_id)
+    try:
+        header = {
+            "version": EXPORT_VERSION,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+            "seq": current_seq(db, user_id),
+        }
+        yield ('{"type":"export","data":' + json.dumps(header) + "}\n").encode()
+        sections = (
+            ("folder", folder_json(), Folder.id, (Folder.user_id == user_id,)),
+            ("tag", tag_json(), Tag.id, (Tag.id.in_(
+                select(TagUsage.tag_id).where(TagUsage.user_id == user_id)
+            ),)),
+            ("note", note_json(), Note.id, (Note.user_id == user_id,)),
+            ("deadline", deadline_json(), Deadline.id, (Deadline.user_id == user_id,)),
+            ("task", task_json(), Task.id, (Task.user_id == user_id,)),
+        )
+        for entity, row_json, id_column, conditions in sections:
+            prefix = '{"type":"' + entity + '","data":'
+            chunk = []
+            for data, row_id in _batches(db, row_json, id_column, *conditions):
+                if entity == "note" and row_id in pending:
+                    data = overlay_note_json(data, pending[row_id])
+                chunk.append(prefix + data + "}\n")
+                if len(chunk) >= EXPORT_BATCH_SIZE:
+                    yield "".join(chunk).encode()
+                    chunk = []
+            if chunk:
+                yield "".join(chunk).encode()
+    finally:
+        db.close()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)  # формат gzip
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@router.get("/export")
+def export_workspace(gzip: bool = False, user: User = Depends(get_current_user)):
+    """Выгрузка всех данных пользователя в формате NDJSON (одна JSON-строка на объект).
+
+    Первая строка - {"type": "export", "data": {"version", "exported_at", "seq"}},
+    дальше {"type": "folder" | "tag" | "note" | "deadline" | "task", "data": {...}}
+    в формате ответов API. Ответ формируется по мере чтения из БД, память не
+    зависит от объема данных. gzip=true - файл .ndjson.gz, сжатый на лету.
+    """
+    lines = export_lines(user.id)
+    filename = f"unitask-export-{datetime.now(timezone.utc):%Y%m%d}.ndjson"
+    if gzip:
+        return StreamingResponse(
+            _gzip(lines),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'},
+        )
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
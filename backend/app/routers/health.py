@@ -1,5 +1,8 @@
 from fastapi import APIRouter
 
+from ..services.response_cache import response_cache
+from ..services.note_write_buffer import note_write_buffer
+
 
 router = APIRouter(prefix="/health", tags=["health"]) 
 
@@ -9,3 +12,13 @@ def healthcheck():
     return {"status": "ok"}
 
 
+@router.get("/cache")
+def cache_stats():
+    """Метрики кэша ответов: доля попаданий и занятая память"""
+    return response_cache.stats()
+
+
+@router.get("/write-buffer")
+def write_buffer_stats():
+    """Метрики отложенной записи заметок: сколько правок объединено, задержка записи, потерянные правки"""
+    return note_write_buffer.stats()
@@ -0,0 +1,417 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Set, Tuple
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from sqlalchemy import insert as core_insert, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..db import SessionLocal, get_db
+from ..deps import get_current_user
+from ..models.import_job import ImportJob, IMPORT_PENDING, IMPORT_RUNNING, IMPORT_DONE, IMPORT_FAILED
+from ..models.todo import Task, Note, Tag, Folder, Deadline, note_tag, task_tag, todo_stats, NOTE_KIND_TODO
+from ..schemas import ImportJobOut
+from ..services.item_input import extract_hashtags, tag_color, parse_due_at
+from ..services.sync_service import change_seq
+from ..services.tag_index import tag_index
+from ..services.tag_usage import add_tag_usage
+from ..services.user_defaults import get_or_create_default_folder_id
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["import"])
+
+MAX_IMPORT_ERRORS = 20  # Сколько ошибок строк сохранять в задаче импорта
+TITLE_MAX_LENGTH = 200
+
+# Записи применяются в этом порядке: заметкам нужны папки, дедлайнам - заметки
+RECORD_TYPES = ("tag", "folder", "note", "deadline", "task")
+
+
+class _RecordError(ValueError):
+    pass
+
+
+def _title(data: dict) -> str:
+    title = data.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise _RecordError("не указан title")
+    return title[:TITLE_MAX_LENGTH]
+
+
+def _tag_names(data: dict) -> Set[str]:
+    """Теги записи: список tags из выгрузки (объекты с name или строки) и хэштеги tags_text"""
+    names = extract_hashtags(data.get("tags_text"))
+    for tag in data.get("tags") or ():
+        name = tag.get("name") if isinstance(tag, dict) else tag
+        if isinstance(name, str) and name.strip():
+            names.add(name.strip().lower())
+    return names
+
+
+class _Importer:
+    """Вставляет записи пачками: один upsert тегов и по одному executemany на таблицу.
+
+    Вставка идет в обход ORM, поэтому все, что при обычной записи делают
+    ORM-события и хелперы crud, здесь делается явно: note_kind/todo_total/todo_done,
+    has_deadline_notifications, change_seq, tag_usage и индекс тегов.
+    """
+
+    def __init__(self, db: Session, user_id: int, job: ImportJob):
+        self.db = db
+        self.user_id = user_id
+        self.job = job
+        self.errors: List[str] = []
+        self.default_folder_id = get_or_create_default_folder_id(db, user_id)
+        # id из файла -> id созданного объекта
+        self.folder_ids: Dict[int, int] = {}
+        self.note_ids: Dict[int, int] = {}
+        self.todo_note_ids: Set[int] = set()
+        self.notes_with_deadline: Set[int] = set()
+        self.tag_colors: Dict[str, str] = {}
+        # Избранной может быть только одна заметка
+        self.has_favorite = db.query(Note.id).filter(
+            Note.user_id == user_id, Note.is_favorite == True
+        ).first() is not None
+
+    def fail(self, line_no: int, message: str) -> None:
+        self.job.skipped += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append(f"Строка {line_no}: {message}")
+
+    def apply(self, records: List[Tuple[int, str, dict]]) -> None:
+        by_type: Dict[str, List[Tuple[int, dict]]] = {record_type: [] for record_type in RECORD_TYPES}
+        for line_no, record_type, data in records:
+            by_type[record_type].append((line_no, data))
+        seq = change_seq(self.db, self.user_id)
+
+        for line_no, data in by_type["tag"]:
+            name, color = data.get("name"), data.get("color")
+            if isinstance(name, str) and isinstance(color, str):
+                self.tag_colors[name.strip().lower()] = color
+        self._insert_folders(by_type["folder"], seq)
+        tag_names = set()
+        notes = self._prepare_notes(by_type["note"], tag_names, seq)
+        tasks = self._prepare_tasks(by_type["task"], tag_names, seq)
+        tag_ids = self._upsert_tags(tag_names)
+        self._insert_items(notes, tag_ids, is_note=True)
+        self._insert_deadlines(by_type["deadline"], seq)
+        self._insert_items(tasks, tag_ids, is_note=False)
+        self.job.errors = list(self.errors)
+
+    @staticmethod
+    def _mapped(ids: Dict[int, int], source_id) -> int | None:
+        return ids.get(source_id) if isinstance(source_id, int) else None
+
+    def _insert_returning_ids(self, table, rows: List[dict]) -> List[int]:
+        if not rows:
+            return []
+        return self.db.execute(
+            core_insert(table).returning(table.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+
+    def _insert_folders(self, records: List[Tuple[int, dict]], seq: int) -> None:
+        rows, source_ids = [], []
+        for line_no, data in records:
+            source_id = data.get("id")
+            if data.get("is_default"):
+                if isinstance(source_id, int):
+                    self.folder_ids[source_id] = self.default_folder_id
+                continue
+            name = data.get("name")
+            if not isinstance(name, str) or not name.strip():
+                self.fail(line_no, "не указано имя папки")
+                continue
+            rows.append({"user_id": self.user_id, "name": name, "is_default": False, "change_seq": seq})
+            source_ids.append(source_id)
+        new_ids = self._insert_returning_ids(Folder.__table__, rows)
+        for source_id, new_id in zip(source_ids, new_ids):
+            if isinstance(source_id, int):
+                self.folder_ids[source_id] = new_id
+        self.job.folders += len(new_ids)
+
+    def _prepare_notes(self, records: List[Tuple[int, dict]], tag_names: Set[str], seq: int) -> list:
+        notes = []
+        for line_no, data in records:
+            try:
+                title = _title(data)
+                content = data.get("content")
+                if content is not None and not isinstance(content, str):
+                    raise _RecordError("content должен быть строкой")
+            except _RecordError as e:
+                self.fail(line_no, str(e))
+                continue
+            folder_id = self._mapped(self.folder_ids, data.get("folder_id")) or self.default_folder_id
+            is_favorite = bool(data.get("is_favorite")) and not self.has_favorite
+            self.has_favorite = self.has_favorite or is_favorite
+            # Вместо ORM-события before_insert (см. _update_note_kind)
+            note_kind, todo_total, todo_done = todo_stats(content)
+            row = {
+                "user_id": self.user_id,
+                "folder_id": folder_id,
+                "title": title,
+                "content": content,
+                "is_favorite": is_favorite,
+                "note_kind": note_kind,
+                "todo_total": todo_total,
+                "todo_done": todo_done,
+                "change_seq": seq,
+            }
+            names = _tag_names(data)
+            tag_names.update(names)
+            notes.append((data.get("id"), row, names))
+        return notes
+
+    def _prepare_tasks(self, records: List[Tuple[int, dict]], tag_names: Set[str], seq: int) -> list:
+        tasks = []
+        for line_no, data in records:
+            try:
+                title = _title(data)
+                description = data.get("description")
+                if description is not None and not isinstance(description, str):
+                    raise _RecordError("description должен быть строкой")
+                try:
+                    due_at = parse_due_at(data.get("due_at"))
+                except (TypeError, ValueError):
+                    raise _RecordError("неверный формат due_at")
+            except _RecordError as e:
+                self.fail(line_no, str(e))
+                continue
+            row = {
+                "user_id": self.user_id,
+                "title": title,
+                "description": description,
+                "due_at": due_at,
+                "is_completed": bool(data.get("is_completed")),
+                "change_seq": seq,
+            }
+            names = _tag_names(data)
+            tag_names.update(names)
+            tasks.append((data.get("id"), row, names))
+        return tasks
+
+    def _upsert_tags(self, names: Set[str]) -> Dict[str, int]:
+        """Один upsert и один select на все теги пачки (вместо _get_or_create_tags на каждый объект)"""
+        if not names:
+            return {}
+        self.db.execute(insert(Tag).values([
+            {"name": name, "color": self.tag_colors.get(name) or tag_color(name)}
+            for name in names
+        ]).on_conflict_do_nothing(index_elements=[Tag.name]))
+        return dict(self.db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+    def _insert_items(self, items: list, tag_ids: Dict[str, int], is_note: bool) -> None:
+        table, association_table, owner_column = (
+            (Note.__table__, note_tag, "note_id") if is_note else (Task.__table__, task_tag, "task_id")
+        )
+        new_ids = self._insert_returning_ids(table, [row for _, row, _ in items])
+        links = []
+        usage = Counter()
+        for (source_id, row, names), new_id in zip(items, new_ids):
+            item_tag_ids = {tag_ids[name] for name in names}
+            links.extend({owner_column: new_id, "tag_id": tag_id} for tag_id in item_tag_ids)
+            usage.update(item_tag_ids)
+            tag_index.record(self.db, self.user_id, is_note, new_id, item_tag_ids, ())
+            if is_note:
+                if isinstance(source_id, int):
+                    self.note_ids[source_id] = new_id
+                if row["note_kind"] == NOTE_KIND_TODO:
+                    self.todo_note_ids.add(new_id)
+        if links:
+            self.db.execute(core_insert(association_table), links)
+        add_tag_usage(self.db, self.user_id, usage, is_note)
+        if is_note:
+            self.job.notes += len(new_ids)
+        else:
+            self.job.tasks += len(new_ids)
+
+    def _insert_deadlines(self, records: List[Tuple[int, dict]], seq: int) -> None:
+        rows = []
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for line_no, data in records:
+            note_id = self._mapped(self.note_ids, data.get("note_id"))
+            if note_id is None:
+                self.fail(line_no, "заметка дедлайна не найдена среди импортированных")
+                continue
+            if note_id not in self.todo_note_ids:
+                self.fail(line_no, "дедлайн можно создать только для todo-заметок")
+                continue
+            if note_id in self.notes_with_deadline:
+                self.fail(line_no, "дедлайн для этой заметки уже импортирован")
+                continue
+            try:
+                deadline_at = datetime.fromisoformat(str(data.get("deadline_at")).replace("Z", "+00:00"))
+            except ValueError:
+                self.fail(line_no, "неверный формат deadline_at")
+                continue
+            if deadline_at.tzinfo is not None:
+                deadline_at = deadline_at.astimezone(timezone.utc).replace(tzinfo=None)
+            self.notes_with_deadline.add(note_id)
+            rows.append({
+                "note_id": note_id,
+                "user_id": self.user_id,
+                "deadline_at": deadline_at,
+                # Эндпоинты не создают дедлайны в прошлом, а импорт переносит их как есть.
+                # Уведомления у прошедших выключаем, иначе планировщик сразу разослал бы
+                # "срок истек" по всем старым дедлайнам из выгрузки
+                "notification_enabled": bool(data.get("notification_enabled")) and deadline_at > now,
+                "change_seq": seq,
+            })
+        new_ids = self._insert_returning_ids(Deadline.__table__, rows)
+        # Флаг заметки, который при обычной записи ставят эндпоинты дедлайнов. Заметка
+        # могла быть вставлена в предыдущей пачке и уже уйти клиенту синхронизации,
+        # поэтому она получает номер этой транзакции
+        flagged = [row["note_id"] for row in rows if row["notification_enabled"]]
+        if flagged:
+            self.db.execute(
+                update(Note).where(Note.id.in_(flagged)).values(has_deadline_notifications=True, change_seq=seq)
+            )
+        self.job.deadlines += len(new_ids)
+
+
+def _open_import_file(path: str):
+    """Файл импорта как текст; сжатый gzip (например, GET /api/export?gzip=true) распаковывается на лету"""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    if compressed:
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def _read_batches(importer: _Importer, lines: Iterator[str], batch_size: int) -> Iterator[List[Tuple[int, str, dict]]]:
+    """Разбирает строки NDJSON по одной и отдает пачки по batch_size записей"""
+    batch = []
+    for line_no, line in enumerate(lines, start=1):
+        importer.job.lines = line_no
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            importer.fail(line_no, "неверный JSON")
+            continue
+        if not isinstance(record, dict):
+            importer.fail(line_no, "ожидается JSON-объект")
+            continue
+        # Формат выгрузки - {"type", "data"}; простая запись - поля прямо в объекте
+        record_type = record.get("type", "note")
+        data = record.get("data") if isinstance(record.get("data"), dict) else record
+        if record_type == "export":
+            continue
+        if record_type not in RECORD_TYPES:
+            importer.fail(line_no, f"неизвестный тип записи: {record_type}")
+            continue
+        batch.append((line_no, record_type, data))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_import(job_id: int, user_id: int, path: str) -> None:
+    """Выполняет импорт из файла (в фоне после ответа на POST /api/import)"""
+    db = SessionLocal()
+    try:
+        job = db.get(ImportJob, job_id)
+        job.status = IMPORT_RUNNING
+        db.commit()
+        try:
+            importer = _Importer(db, user_id, job)
+            with _open_import_file(path) as lines:
+                for batch in _read_batches(importer, lines, settings.import_batch_size):
+                    importer.apply(batch)
+                    # Пачка и счетчики задачи - одна транзакция
+                    db.commit()
+            job.errors = list(importer.errors)
+            job.status = IMPORT_DONE
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Ошибка импорта {job_id}: {e}")
+            job.status = IMPORT_FAILED
+            job.error = str(e)
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        logger.info(
+            f"Импорт {job_id}: {job.status}, заметок {job.notes}, задач {job.tasks}, "
+            f"папок {job.folders}, дедлайнов {job.deadlines}, пропущено {job.skipped}"
+        )
+    finally:
+        db.close()
+        os.remove(path)
+
+
+def _job_to_out(job: ImportJob) -> ImportJobOut:
+    return ImportJobOut(
+        id=job.id,
+        status=job.status,
+        lines=job.lines,
+        folders=job.folders,
+        notes=job.notes,
+        tasks=job.tasks,
+        deadlines=job.deadlines,
+        skipped=job.skipped,
+        errors=job.errors or [],
+        error=job.error,
+    )
+
+
+def _create_job(user_id: int) -> ImportJobOut:
+    db = SessionLocal()
+    try:
+        job = ImportJob(user_id=user_id, status=IMPORT_PENDING, errors=[])
+        db.add(job)
+        db.commit()
+        return _job_to_out(job)
+    finally:
+        db.close()
+
+
+@router.post("/import", response_model=ImportJobOut, status_code=202)
+async def start_import(request: Request, background_tasks: BackgroundTasks, user=Depends(get_current_user)):
+    """Импорт данных из NDJSON (можно сжатого gzip).
+
+    Принимает формат GET /api/export ({"type", "data"} на строку) или простые
+    записи {"type": "note" | "task", "title", "content", "tags_text", ...}
+    (без type - заметка). Данные добавляются к существующим: папки и
+    объекты создаются заново, id из файла используются только для связей
+    (заметка - папка, дедлайн - заметка).
+
+    Тело сохраняется во временный файл по мере получения, импорт идет в фоне
+    пачками по IMPORT_BATCH_SIZE записей. Ответ - задача импорта, ее состояние
+    отдает GET /api/import/{id}.
+    """
+    user_id = user.id
+    fd, path = tempfile.mkstemp(prefix="unitask-import-", suffix=".ndjson")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.import_max_bytes:
+                    raise HTTPException(status_code=413, detail="Файл импорта слишком большой")
+                f.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Пустой файл импорта")
+        job = await run_in_threadpool(_create_job, user_id)
+    except BaseException:
+        os.remove(path)
+        raise
+    background_tasks.add_task(run_import, job.id, user_id, path)
+    return job
+
+
+@router.get("/import/{job_id}", response_model=ImportJobOut)
+def get_import(job_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.user_id == user.id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Импорт не найден")
+    return _job_to_out(job)
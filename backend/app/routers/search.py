@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Literal
+import logging
+
+from ..db import get_db
+from ..deps import get_current_user, list_etag
+from ..models.user import User
+from ..pagination import DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, encode_cursor, decode_cursor
+from ..schemas import SearchHit, SearchPage
+from ..services.response_cache import CachedList
+from ..services.search_service import build_match_query, highlight_snippet, search
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["search"])
+
+
+@router.get("/search", response_model=SearchPage)
+def search_notes_and_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    entity: Literal["note", "task"] | None = None,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+    cache: CachedList = Depends(list_etag),
+):
+    """Полнотекстовый поиск по заметкам (заголовок, текст, пункты todo) и задачам.
+
+    Результаты отсортированы по релевантности, последнее слово запроса ищется
+    по префиксу. entity ограничивает поиск заметками или задачами.
+    """
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
+    
+    match = build_match_query(q)
+    if match is None:
+        return cache.store(SearchPage(items=[]))
+    
+    after = None
+    if cursor:
+        score, after_entity, after_id = decode_cursor(cursor, 3)
+        if not isinstance(score, (int, float)) or not isinstance(after_entity, str) or not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Неверный курсор пагинации")
+        after = (score, after_entity, after_id)
+    
+    rows = search(db, user.id, match, entity, limit + 1, after)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.score, last.entity, last.id])
+    
+    items = [
+        SearchHit(entity=row.entity, id=row.id, title=row.title, snippet=highlight_snippet(row.snippet), score=row.score)
+        for row in rows
+    ]
+    return cache.store(SearchPage(items=items, next_cursor=next_cursor))
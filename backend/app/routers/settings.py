@@ -3,39 +3,32 @@ from sqlalchemy.orm import Session
 import logging
 
 from ..db import get_db
-from ..deps import get_current_user
+from ..deps import get_current_user, list_etag
 from ..models.user import User
 from ..models.user_settings import UserSettings
 from ..schemas import UserSettingsOut, UserSettingsUpdate
+from ..services.sync_service import mark_changed
+from ..services.response_cache import CachedList
+from ..services.user_defaults import get_settings
+from ..serializers import settings_to_out
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["settings"])
 
 
 @router.get("/settings", response_model=UserSettingsOut)
-def get_user_settings(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_user_settings(db: Session = Depends(get_db), user: User = Depends(get_current_user), cache: CachedList = Depends(list_etag)):
     """Получить настройки пользователя"""
-    settings = db.query(UserSettings).filter(UserSettings.user_id == user.id).first()
-    
-    if not settings:
-        # Создаем настройки по умолчанию, если их нет
-        settings = UserSettings(
-            user_id=user.id,
-            language="ru",
-            theme="dark",
-            notification_times_minutes=[30]  # По умолчанию одно уведомление за 30 минут
-        )
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
+    cached = cache.lookup()
+    if cached is not None:
+        return cached
     
-    # Убеждаемся, что notification_times_minutes это список
-    if not isinstance(settings.notification_times_minutes, list):
-        settings.notification_times_minutes = [30]
-        db.commit()
-        db.refresh(settings)
+    # Настройки создаются вместе с пользователем (services/user_defaults), GET ничего не пишет
+    settings = get_settings(db, user.id)
+    if settings is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Настройки не найдены")
     
-    return settings
+    return cache.store(settings_to_out(settings))
 
 
 @router.put("/settings", response_model=UserSettingsOut)
@@ -116,6 +109,7 @@ def update_user_settings(
                         DeadlineNotification.notification_type != "expired"
                     ).delete(synchronize_session=False)
     
+    mark_changed(db, user.id, settings)
     db.commit()
     db.refresh(settings)
     
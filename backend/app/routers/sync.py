@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+import logging
+
+from ..db import get_db
+from ..deps import get_current_user
+from ..models.todo import Task, Note, Folder, Deadline
+from ..models.user_settings import UserSettings
+from ..models.sync import Tombstone
+from ..schemas import SyncOut, SyncDeleted
+from ..serializers import task_to_out, note_to_out, folder_to_out, deadline_to_out, settings_to_out
+from ..services.sync_service import current_seq
+from ..services.note_write_buffer import note_write_buffer
+from ..services.tag_cache import note_tags, task_tags
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api", tags=["sync"])
+
+
+def _parse_token(since: str | None) -> int | None:
+    if since is None or since == "":
+        return None
+    try:
+        value = int(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный токен синхронизации")
+    if value < 0:
+        raise HTTPException(status_code=400, detail="Неверный токен синхронизации")
+    return value
+
+
+@router.get("/sync", response_model=SyncOut)
+def sync_changes(since: str | None = None, db: Session = Depends(get_db), user=Depends(get_current_user)):
+    """Возвращает заметки, задачи, папки, дедлайны и настройки, измененные после токена since.
+
+    Без since (или с токеном из будущего, например после пересоздания БД)
+    возвращает полный снимок с full=true.
+    """
+    token = current_seq(db, user.id)
+    since_seq = _parse_token(since)
+    full = since_seq is None or since_seq > token
+    # Для полного снимка берем все строки: у данных до появления синхронизации change_seq = 0
+    after = -1 if full else since_seq
+    
+    # Заметки с несохраненными автосохранениями отдаем с правками из буфера, даже
+    # если в БД они не менялись; после сброса буфера они придут еще раз с новым seq
+    pending = note_write_buffer.user_pending(user.id)
+    changed = Note.change_seq > after
+    notes = db.query(Note).filter(
+        Note.user_id == user.id,
+        or_(changed, Note.id.in_(pending)) if pending else changed
+    ).all()
+    tasks = db.query(Task).filter(
+        Task.user_id == user.id,
+        Task.change_seq > after
+    ).all()
+    folders = db.query(Folder).filter(
+        Folder.user_id == user.id,
+        Folder.change_seq > after
+    ).order_by(Folder.is_default.desc(), Folder.created_at.asc()).all()
+    deadlines = db.query(Deadline).filter(
+        Deadline.user_id == user.id,
+        Deadline.change_seq > after
+    ).all()
+    settings = db.query(UserSettings).filter(
+        UserSettings.user_id == user.id,
+        UserSettings.change_seq > after
+    ).first()
+    
+    deleted = []
+    if not full:
+        tombstones = db.query(Tombstone.entity, Tombstone.entity_id).filter(
+            Tombstone.user_id == user.id,
+            Tombstone.seq > after
+        ).order_by(Tombstone.seq.asc()).all()
+        deleted = [SyncDeleted(entity=entity, id=entity_id) for entity, entity_id in tombstones]
+    
+    tags_by_note = note_tags(db, [n.id for n in notes])
+    tags_by_task = task_tags(db, [t.id for t in tasks])
+    
+    return SyncOut(
+        token=str(token),
+        full=full,
+        notes=[
+            note_to_out(n, tags_by_note.get(n.id, [])).model_copy(update=pending.get(n.id, {}))
+            for n in notes
+        ],
+        tasks=[task_to_out(t, tags_by_task.get(t.id, [])) for t in tasks],
+        folders=[folder_to_out(f) for f in folders],
+        deadlines=[deadline_to_out(d) for d in deadlines],
+        settings=settings_to_out(settings) if settings else None,
+        deleted=deleted,
+    )
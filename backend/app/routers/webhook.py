@@ -4,6 +4,7 @@ import logging
 
 from ..db import get_db
 from ..models.user import User
+from ..services.user_defaults import create_user
 
 router = APIRouter(tags=["webhook"])
 logger = logging.getLogger(__name__)
@@ -31,8 +32,7 @@ def _upsert_user_from_update(db: Session, u: dict) -> None:
     if db.query(User).filter(User.username == username).first() is not None:
         username = f"{username}_{user_id}"
 
-    new_user = User(username=username, uuid=uuid)
-    db.add(new_user)
+    create_user(db, username, uuid)
     db.commit()
 
 
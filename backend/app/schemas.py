@@ -1,6 +1,6 @@
-from typing import Optional, Any
+from typing import Optional, Any, Literal
 from datetime import datetime
-from pydantic import BaseModel, field_serializer, model_validator
+from pydantic import BaseModel, Field, field_serializer, field_validator, model_validator
 
 
 class UserCreate(BaseModel):
@@ -78,6 +78,12 @@ class TagOut(TagBase):
         from_attributes = True
 
 
+class TagUsageOut(TagOut):
+    """Тег в списке тегов пользователя (GET /api/tags)"""
+    note_count: int = 0
+    task_count: int = 0
+
+
 # Tasks
 class TaskBase(BaseModel):
     title: str
@@ -110,6 +116,11 @@ class TaskOut(BaseModel):
         from_attributes = True
 
 
+class TaskPage(BaseModel):
+    items: list[TaskOut]
+    next_cursor: str | None = None  # None - это последняя страница
+
+
 # Folders
 class FolderBase(BaseModel):
     name: str
@@ -167,6 +178,13 @@ class FolderOut(BaseModel):
 
 
 # Notes
+class FolderCountsOut(FolderOut):
+    """Папка со счетчиками (GET /api/folders?with_counts=1); у папки "Все" - итоги по всем заметкам"""
+    note_count: int = 0
+    favorite_count: int = 0
+    deadline_count: int = 0
+
+
 class NoteBase(BaseModel):
     title: str
     content: str | None = None
@@ -184,6 +202,14 @@ class NoteUpdate(BaseModel):
     tags_text: str | None = None  # текст с тегами
     folder_id: int | None = None
 
+    @field_validator('title')
+    @classmethod
+    def title_not_null(cls, value: str | None) -> str | None:
+        """Заголовок можно не передавать, но не очистить: в БД он обязателен"""
+        if value is None:
+            raise ValueError("Заголовок заметки не может быть null")
+        return value
+
 
 class NoteOut(BaseModel):
     id: int
@@ -193,11 +219,63 @@ class NoteOut(BaseModel):
     is_favorite: bool = False
     tags: list[TagOut]
     has_deadline_notifications: bool = False  # Есть ли дедлайн с включенными уведомлениями
+    version: int = 0  # Номер последнего изменения заметки; base_version для PATCH /notes/{id}/delta
 
     class Config:
         from_attributes = True
 
 
+class NotePage(BaseModel):
+    items: list[NoteOut]
+    next_cursor: str | None = None  # None - это последняя страница
+
+
+class NoteSummaryOut(BaseModel):
+    """Заметка в списке без полного content (GET /api/notes?view=summary)"""
+    id: int
+    title: str
+    folder_id: int | None
+    is_favorite: bool = False
+    tags: list[TagOut]
+    has_deadline_notifications: bool = False
+    is_todo: bool
+    content_preview: str | None  # Начало текста заметки; None для todo-заметок
+    todo_total: int | None = None  # Количество пунктов todo
+    todo_done: int | None = None  # Количество выполненных пунктов todo
+
+
+class NoteSummaryPage(BaseModel):
+    items: list[NoteSummaryOut]
+    next_cursor: str | None = None
+
+
+MAX_NOTE_DELTA_OPS = 1000
+
+
+class NoteDeltaOperation(BaseModel):
+    """Операция над содержимым заметки.
+
+    text - замена диапазона [start, end) в content на text; позиции в единицах
+    UTF-16, как у строк JavaScript. Остальные - операции JSON Patch (RFC 6902)
+    над todo-JSON заметки: path и from - JSON Pointer, например "/items/2/completed".
+    """
+    op: Literal["text", "add", "remove", "replace", "move", "copy", "test"]
+    start: int | None = Field(None, ge=0)
+    end: int | None = Field(None, ge=0)
+    text: str | None = None
+    path: str | None = None
+    from_: str | None = Field(None, alias="from")
+    value: Any = None
+
+
+class NoteDelta(BaseModel):
+    """Изменения заметки относительно версии base_version (NoteOut.version)"""
+    base_version: int
+    ops: list[NoteDeltaOperation] = Field(default_factory=list, max_length=MAX_NOTE_DELTA_OPS)
+    title: str | None = None
+    tags_text: str | None = None  # Теги перезаписываются, только если набор хэштегов изменился
+
+
 # Deadlines
 class DeadlineCreate(BaseModel):
     note_id: int
@@ -217,11 +295,22 @@ class DeadlineOut(BaseModel):
     days_remaining: int | None = None
     status: str | None = None  # "active", "today", "overdue"
     time_remaining_text: str | None = None
+    today_from: str | None = None  # С этого момента статус "today", с deadline_at - "overdue"
 
     class Config:
         from_attributes = True
 
 
+class DeadlineAgendaOut(DeadlineOut):
+    """Дедлайн в списке GET /api/deadlines: с заголовком заметки"""
+    note_title: str
+
+
+class DeadlinePage(BaseModel):
+    items: list[DeadlineAgendaOut]
+    next_cursor: str | None = None  # None - это последняя страница
+
+
 # User Settings
 class UserSettingsOut(BaseModel):
     id: int
@@ -239,3 +328,90 @@ class UserSettingsUpdate(BaseModel):
     theme: str | None = None  # "light" or "dark"
     notification_times_minutes: list[int] | None = None  # Массив минут до дедлайна (до 10 штук)
 
+
+
+# Sync
+class SyncDeleted(BaseModel):
+    entity: str  # "note", "task", "folder", "deadline"
+    id: int
+
+
+class SyncOut(BaseModel):
+    token: str  # Передается в следующий запрос как since
+    full: bool  # True - это полный снимок, клиент должен заменить локальные данные
+    notes: list[NoteOut]
+    tasks: list[TaskOut]
+    folders: list[FolderOut]
+    deadlines: list[DeadlineOut]
+    settings: UserSettingsOut | None = None  # None - настройки не менялись
+    deleted: list[SyncDeleted]
+
+
+# Batch
+MAX_BATCH_OPERATIONS = 200
+
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    entity: Literal["note", "task", "folder", "deadline"]
+    id: int | None = None  # Для update/delete; у дедлайна это id заметки, как в /deadlines/{note_id}
+    data: dict[str, Any] | None = None  # Тело запроса как у обычного эндпоинта (NoteCreate, TaskUpdate...)
+    idempotency_key: str | None = Field(None, max_length=128)  # Повтор с тем же ключом не применяется
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+
+class BatchResult(BaseModel):
+    index: int
+    op: str
+    entity: str
+    id: int | None  # id созданного/измененного/удаленного объекта
+    replayed: bool = False  # True - результат ранее выполненной операции с тем же ключом
+    data: NoteOut | TaskOut | FolderOut | DeadlineOut | None = None  # None для delete
+
+
+class BatchOut(BaseModel):
+    results: list[BatchResult]
+
+
+# Bootstrap
+class BootstrapOut(BaseModel):
+    """Начальное состояние приложения (GET /api/bootstrap)"""
+    user: UserOut
+    settings: UserSettingsOut
+    folders: list[FolderOut]
+    notes: list[NoteOut]  # Все заметки пользователя, как GET /api/notes без фильтров
+    favorite_note: NoteOut | None = None
+    tags: list[TagUsageOut]
+    deadlines: list[DeadlineOut]
+
+
+# Search
+class SearchHit(BaseModel):
+    entity: str  # "note" или "task"
+    id: int
+    title: str
+    snippet: str  # Фрагмент в HTML: текст экранирован, совпадения выделены <mark>...</mark>
+    score: float  # Релевантность (-bm25), больше - лучше
+
+
+class SearchPage(BaseModel):
+    items: list[SearchHit]
+    next_cursor: str | None = None
+
+
+# Import
+class ImportJobOut(BaseModel):
+    """Состояние импорта (POST /api/import, GET /api/import/{job_id})"""
+    id: int
+    status: str  # "pending", "running", "done", "failed"
+    lines: int
+    folders: int
+    notes: int
+    tasks: int
+    deadlines: int
+    skipped: int
+    errors: list[str]
+    error: str | None = None
@@ -19,6 +19,17 @@ def create_access_token(subject: str, expires_minutes: Optional[int] = None) ->
     return token
 
 
+# Назначение токена в claim "scope". Основной токен (без scope) принимается
+# только в заголовке Authorization
+SCOPE_EVENTS = "events"
+
+
+def create_scoped_token(subject: str, scope: str, expires_seconds: int) -> str:
+    """Короткоживущий токен, который подходит только для одного эндпоинта (scope)"""
+    expire = datetime.now(tz=timezone.utc) + timedelta(seconds=expires_seconds)
+    return jwt.encode({"sub": subject, "exp": expire, "scope": scope}, settings.secret_key, algorithm="HS256")
+
+
 def decode_access_token(token: str) -> dict:
     """
     Декодирует JWT токен.
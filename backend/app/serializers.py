@@ -0,0 +1,150 @@
+"""
+Преобразование ORM-объектов в схемы ответов API.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from .schemas import UserOut, TagOut, TaskOut, NoteOut, FolderOut, DeadlineOut, UserSettingsOut
+
+
+def user_to_out(user) -> UserOut:
+    # created_at конвертируем в строку заранее: Pydantic v2 с from_attributes=True
+    # может не вызывать field_serializer правильно
+    return UserOut(
+        id=user.id,
+        username=user.username,
+        uuid=user.uuid,
+        created_at=user.created_at.isoformat() if isinstance(user.created_at, datetime) else str(user.created_at)
+    )
+
+
+def tag_to_out(tag) -> TagOut:
+    return TagOut(id=tag.id, name=tag.name, color=tag.color)
+
+
+def task_to_out(task, tags: List[TagOut] | None = None) -> TaskOut:
+    """tags - готовые теги (services/tag_cache); без них читается ленивая связь task.tags"""
+    if tags is None:
+        tags = [tag_to_out(tag) for tag in (task.tags or [])]
+    return TaskOut(
+        id=task.id,
+        title=task.title,
+        description=task.description,
+        due_at=task.due_at.isoformat() if task.due_at else None,
+        is_completed=task.is_completed,
+        tags=tags
+    )
+
+
+def note_to_out(note, tags: List[TagOut] | None = None) -> NoteOut:
+    """tags - готовые теги (services/tag_cache); без них читается ленивая связь note.tags"""
+    if tags is None:
+        tags = [tag_to_out(tag) for tag in (note.tags or [])]
+    return NoteOut(
+        id=note.id,
+        title=note.title,
+        content=note.content,
+        folder_id=note.folder_id,
+        is_favorite=note.is_favorite,
+        tags=tags,
+        has_deadline_notifications=note.has_deadline_notifications,
+        version=note.change_seq or 0,
+    )
+
+
+def folder_to_out(folder) -> FolderOut:
+    return FolderOut(
+        id=folder.id,
+        name=folder.name,
+        is_default=folder.is_default,
+        created_at=folder.created_at.isoformat() if folder.created_at else ""
+    )
+
+
+def settings_to_out(settings) -> UserSettingsOut:
+    times = settings.notification_times_minutes
+    return UserSettingsOut(
+        id=settings.id,
+        user_id=settings.user_id,
+        language=settings.language,
+        theme=settings.theme,
+        notification_times_minutes=times if isinstance(times, list) else [30]
+    )
+
+
+# deadline_mode: relative - оставшееся время считает сервер на момент запроса,
+# absolute - только даты, ответ не зависит от времени запроса
+DEADLINE_MODE_RELATIVE = "relative"
+DEADLINE_MODE_ABSOLUTE = "absolute"
+# За сколько до дедлайна его статус становится "today"
+DEADLINE_TODAY_WINDOW = timedelta(hours=24)
+
+
+def calculate_deadline_info(deadline_at: datetime) -> dict:
+    """Вычисляет информацию о дедлайне (оставшееся время, статус, текст)."""
+    # Приводим deadline_at к timezone-aware datetime
+    if deadline_at.tzinfo is None:
+        deadline_at = deadline_at.replace(tzinfo=timezone.utc)
+
+    now = datetime.now(timezone.utc)
+    time_until = deadline_at - now
+    total_seconds = int(time_until.total_seconds())
+    total_minutes = total_seconds // 60
+    total_hours = total_minutes // 60
+    days_remaining = total_hours // 24
+
+    if total_seconds < 0:
+        status = "overdue"
+        time_remaining_text = "просрочен"
+        days_remaining = 0
+    elif days_remaining == 0 and total_hours < 24:
+        if total_hours == 0:
+            status = "today"
+            time_remaining_text = "сегодня"
+        else:
+            status = "today"
+            remaining_mins = total_minutes % 60
+            if remaining_mins > 0:
+                time_remaining_text = f"сегодня ({total_hours} ч. {remaining_mins} мин.)"
+            else:
+                time_remaining_text = f"сегодня ({total_hours} ч.)"
+    else:
+        status = "active"
+        remaining_hours = total_hours % 24
+        remaining_mins = total_minutes % 60
+
+        if days_remaining == 1:
+            time_remaining_text = "1 день"
+        elif 2 <= days_remaining <= 4:
+            time_remaining_text = f"{days_remaining} дня"
+        else:
+            time_remaining_text = f"{days_remaining} дней"
+
+        if remaining_hours > 0:
+            time_remaining_text += f" {remaining_hours} {'час' if remaining_hours == 1 else 'часа' if 2 <= remaining_hours <= 4 else 'часов'}"
+        if remaining_mins > 0:
+            time_remaining_text += f" {remaining_mins} {'минута' if remaining_mins == 1 else 'минуты' if 2 <= remaining_mins <= 4 else 'минут'}"
+
+    return {
+        "days_remaining": days_remaining,
+        "status": status,
+        "time_remaining_text": time_remaining_text
+    }
+
+
+def deadline_to_out(deadline, mode: str = DEADLINE_MODE_RELATIVE) -> DeadlineOut:
+    """В режиме absolute поля оставшегося времени не заполняются: клиент считает их
+    сам по deadline_at (статус overdue) и today_from (статус today)"""
+    result = DeadlineOut(
+        id=deadline.id,
+        note_id=deadline.note_id,
+        deadline_at=deadline.deadline_at.isoformat(),
+        notification_enabled=deadline.notification_enabled,
+        today_from=(deadline.deadline_at - DEADLINE_TODAY_WINDOW).isoformat(),
+    )
+    if mode == DEADLINE_MODE_RELATIVE:
+        info = calculate_deadline_info(deadline.deadline_at)
+        result.days_remaining = info["days_remaining"]
+        result.status = info["status"]
+        result.time_remaining_text = info["time_remaining_text"]
+    return result
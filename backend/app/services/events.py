@@ -0,0 +1,336 @@
+"""
+События об изменениях данных пользователя для потока GET /api/events (Server-Sent Events).
+
+Публикуют их записывающие эндпоинты (после коммита, через sync_service) и
+планировщик уведомлений. Подписчики - открытые потоки SSE.
+
+Брокер выбирается настройкой EVENTS_BROKER:
+- memory - события доставляются только подписчикам этого процесса, последние
+  события пользователя хранятся в памяти. Подходит для одного воркера.
+- sqlite - события пишутся в таблицу event_log общей БД, а каждый процесс
+  читает новые записи, как только PRAGMA data_version сообщит о чужом коммите.
+  Так событие из одного воркера (или webhook_server.py) доходит до клиентов,
+  подключенных к другому.
+
+Клиент, переподключившийся с Last-Event-ID, получает пропущенные события. Если
+их уже нет (история очищена или процесс перезапущен), вместо них приходит
+событие resync - клиенту нужно перечитать данные. Так же поступаем с клиентом,
+который не успевает читать поток: очередь подписчика ограничена, и при
+переполнении накопленные события заменяются одним resync.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Deque, Dict, List, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import engine
+from ..models.sync import EventLog
+from .sync_service import on_user_commit
+
+logger = logging.getLogger(__name__)
+
+BROKER_MEMORY = "memory"
+BROKER_SQLITE = "sqlite"
+
+# Типы событий
+EVENT_CHANGE = "change"  # Изменены заметки, задачи, папки, дедлайны или настройки
+EVENT_DEADLINE_STATUS = "deadline_status"  # Дедлайн перешел в статус today или overdue
+EVENT_REMINDER = "reminder"  # Отправлено напоминание о дедлайне
+EVENT_RESYNC = "resync"  # Пропущенные события недоступны, данные нужно перечитать
+
+# (id, тип, JSON данных)
+Event = Tuple[str, str, str]
+
+
+class Subscription:
+    """Поток событий одного подключения: ограниченная очередь в event loop, где открыт поток"""
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, max_size: int, catching_up: bool = False):
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue()
+        self.max_size = max_size
+        self._loop = loop
+        self._last_number = 0
+        # События от брокера, пришедшие до пропущенных (пока их читает subscribe)
+        self._backlog: List[Tuple[int, Event]] | None = [] if catching_up else None
+
+    def push(self, number: int, event: Event) -> None:
+        """Кладет событие в очередь; можно вызывать из любого потока"""
+        try:
+            self._loop.call_soon_threadsafe(self._put, number, event)
+        except RuntimeError:
+            # Event loop уже закрыт - подключение завершилось
+            pass
+
+    def catch_up(self, missed: List[Tuple[int, Event]]) -> None:
+        """Кладет в очередь пропущенные события, а за ними - пришедшие от брокера
+        за время их чтения; можно вызывать из любого потока"""
+        try:
+            self._loop.call_soon_threadsafe(self._catch_up, missed)
+        except RuntimeError:
+            pass
+
+    def _catch_up(self, missed: List[Tuple[int, Event]]) -> None:
+        backlog, self._backlog = self._backlog or [], None
+        for number, event in [*missed, *backlog]:
+            self._put(number, event)
+
+    def _put(self, number: int, event: Event) -> None:
+        if self._backlog is not None:
+            self._backlog.append((number, event))
+            return
+        # Событие могло прийти дважды: из догоняющей выборки и от брокера
+        if number and number <= self._last_number:
+            return
+        self._last_number = max(self._last_number, number)
+        if self.queue.qsize() >= self.max_size:
+            # Клиент не успевает читать: вместо накопленных событий отдаем resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = (event[0], EVENT_RESYNC, "{}")
+        self.queue.put_nowait(event)
+
+
+class EventBroker(ABC):
+    """Подписчики процесса; как события попадают к ним, определяют наследники"""
+
+    def __init__(self, epoch: str, queue_size: int):
+        self._epoch = epoch
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    def publish(self, user_id: int, event_type: str, data: dict) -> None:
+        """Доставляет событие подписчикам пользователя во всех процессах, которые видит брокер"""
+
+    def subscribe(self, user_id: int, last_event_id: str | None,
+                  loop: asyncio.AbstractEventLoop) -> Subscription:
+        """Подписка на события пользователя; при last_event_id в очередь сначала
+        попадают пропущенные события (или resync). Может обращаться к БД, поэтому
+        вызывается не из event loop"""
+        subscription = Subscription(user_id, loop, self.queue_size, catching_up=bool(last_event_id))
+        # Подписываемся до чтения пропущенных: иначе события, опубликованные во время
+        # чтения, не попали бы ни в выборку, ни к подписке. Повторы подписка
+        # отбрасывает по номеру события
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        if last_event_id:
+            # Без self._lock: у sqlite это запрос к БД, и под блокировкой он задерживал
+            # бы доставку событий всем подписчикам процесса
+            try:
+                missed = self._missed(user_id, last_event_id)
+            except Exception:
+                self.unsubscribe(subscription)
+                raise
+            subscription.catch_up(missed)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def _event(self, number: int, event_type: str, data: str) -> Tuple[int, Event]:
+        return number, (f"{self._epoch}-{number}", event_type, data)
+
+    def _deliver(self, user_id: int, number: int, event: Event) -> None:
+        # Вызывается под self._lock: события доходят до подписчиков в порядке номеров
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.push(number, event)
+
+    def _resume_number(self, last_event_id: str) -> int | None:
+        """Номер из Last-Event-ID или None, если id выдан не этим брокером"""
+        epoch, _, number = last_event_id.partition("-")
+        if epoch != self._epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    @abstractmethod
+    def _missed(self, user_id: int, last_event_id: str) -> List[Tuple[int, Event]]:
+        """События пользователя после last_event_id или одно событие resync, если
+        продолжить поток с него нельзя. Вызывается без self._lock"""
+
+
+class MemoryEventBroker(EventBroker):
+    def __init__(self, queue_size: int, history_size: int):
+        super().__init__(format(int(time.time()), "x"), queue_size)
+        self.history_size = history_size
+        self._counter = 0
+        self._history: Dict[int, Deque[Tuple[int, Event]]] = {}
+        # Номер последнего события пользователя, вытесненного из истории
+        self._evicted: Dict[int, int] = {}
+
+    def publish(self, user_id: int, event_type: str, data: dict) -> None:
+        with self._lock:
+            self._counter += 1
+            number, event = self._event(self._counter, event_type, json.dumps(data, ensure_ascii=False))
+            history = self._history.setdefault(user_id, deque())
+            if len(history) >= self.history_size:
+                self._evicted[user_id] = history.popleft()[0]
+            history.append((number, event))
+            self._deliver(user_id, number, event)
+
+    def _missed(self, user_id: int, last_event_id: str) -> List[Tuple[int, Event]]:
+        last = self._resume_number(last_event_id)
+        with self._lock:
+            history = self._history.get(user_id, ())
+            if last is None or last < self._evicted.get(user_id, 0) or last > self._counter:
+                # id resync - последнее событие пользователя: после перечитывания данных
+                # клиент переподключится с ним и не получит старые события повторно
+                latest = history[-1][0] if history else 0
+                return [self._event(latest, EVENT_RESYNC, "{}")]
+            return [(number, event) for number, event in history if number > last]
+
+
+class SqliteLogEventBroker(EventBroker):
+    """События через таблицу event_log; номер события - id записи журнала"""
+
+    # Сколько записей журнала читать за один запрос
+    BATCH_SIZE = 500
+    CLEANUP_INTERVAL_SECONDS = 60
+
+    def __init__(self, engine: Engine, queue_size: int, poll_interval: float, retention_seconds: int):
+        super().__init__("log", queue_size)
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._last_id = 0
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def publish(self, user_id: int, event_type: str, data: dict) -> None:
+        # Отдельная короткая транзакция: вызывается уже после коммита изменений.
+        # Подписчикам событие доставит поток чтения журнала, как и чужие события
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(EventLog).values(
+                    user_id=user_id, type=event_type, data=json.dumps(data, ensure_ascii=False)
+                ))
+        except Exception as e:
+            # Изменения уже закоммичены; клиенты догонят их через resync или /api/sync
+            logger.error(f"Не удалось записать событие {event_type} в журнал: {e}")
+
+    def start(self) -> None:
+        with self.engine.connect() as conn:
+            self._last_id = conn.execute(select(func.max(EventLog.id))).scalar() or 0
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._tail, name="event-log-tail", daemon=True)
+        self._thread.start()
+        logger.info("События доставляются через таблицу event_log")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _tail(self) -> None:
+        """Читает новые записи журнала, когда БД меняет другое соединение"""
+        data_version = None
+        last_cleanup = 0.0
+        # data_version меняется только от коммитов других соединений, поэтому
+        # соединение для опроса держим все время работы потока
+        with self.engine.connect() as conn:
+            while not self._stopped.wait(self.poll_interval):
+                try:
+                    version = conn.exec_driver_sql("PRAGMA data_version").scalar()
+                    if version != data_version:
+                        data_version = version
+                        self._read_new(conn)
+                    if time.monotonic() - last_cleanup >= self.CLEANUP_INTERVAL_SECONDS:
+                        last_cleanup = time.monotonic()
+                        self._cleanup(conn)
+                    conn.rollback()
+                except Exception as e:
+                    logger.error(f"Ошибка чтения журнала событий: {e}")
+                    conn.rollback()
+
+    def _read_new(self, conn) -> None:
+        while True:
+            rows = conn.execute(
+                select(EventLog.id, EventLog.user_id, EventLog.type, EventLog.data)
+                .where(EventLog.id > self._last_id)
+                .order_by(EventLog.id)
+                .limit(self.BATCH_SIZE)
+            ).all()
+            with self._lock:
+                for row_id, user_id, event_type, data in rows:
+                    number, event = self._event(row_id, event_type, data)
+                    self._deliver(user_id, number, event)
+            if rows:
+                self._last_id = rows[-1][0]
+            if len(rows) < self.BATCH_SIZE:
+                return
+
+    def _cleanup(self, conn) -> None:
+        conn.execute(delete(EventLog).where(
+            EventLog.created_at < func.datetime("now", f"-{self.retention_seconds} seconds")
+        ))
+        conn.commit()
+
+    def _missed(self, user_id: int, last_event_id: str) -> List[Tuple[int, Event]]:
+        last = self._resume_number(last_event_id)
+        with self.engine.connect() as conn:
+            first_id, latest_id = conn.execute(select(func.min(EventLog.id), func.max(EventLog.id))).one()
+            # Если до первой сохраненной записи были удаленные события, или id больше
+            # последнего (журнал создан заново), продолжить поток нельзя
+            if last is not None and (first_id or 1) - 1 <= last <= (latest_id or 0):
+                rows = conn.execute(
+                    select(EventLog.id, EventLog.type, EventLog.data)
+                    .where(EventLog.user_id == user_id, EventLog.id > last)
+                    .order_by(EventLog.id)
+                ).all()
+                return [self._event(row_id, event_type, data) for row_id, event_type, data in rows]
+        return [self._event(latest_id or 0, EVENT_RESYNC, "{}")]
+
+
+def format_event(event: Event) -> str:
+    """Событие в формате text/event-stream"""
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+def _create_broker() -> EventBroker:
+    if settings.events_broker == BROKER_MEMORY:
+        return MemoryEventBroker(
+            queue_size=settings.events_queue_size,
+            history_size=settings.events_history_size,
+        )
+    if settings.events_broker == BROKER_SQLITE:
+        if engine.dialect.name != "sqlite":
+            raise ValueError("EVENTS_BROKER=sqlite работает только с SQLite")
+        return SqliteLogEventBroker(
+            engine,
+            queue_size=settings.events_queue_size,
+            poll_interval=settings.events_poll_interval_ms / 1000,
+            retention_seconds=settings.events_log_retention_seconds,
+        )
+    raise ValueError(f"Неизвестный EVENTS_BROKER: {settings.events_broker}")
+
+
+event_broker = _create_broker()
+
+
+@on_user_commit
+def _publish_changes(session: Session, committed: Dict[int, int], changes: Dict[int, list]) -> None:
+    for user_id, seq in committed.items():
+        event_broker.publish(user_id, EVENT_CHANGE, {"seq": seq, "changes": changes.get(user_id, [])})
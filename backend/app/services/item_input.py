@@ -0,0 +1,39 @@
+"""
+Разбор полей заметок и задач, которые присылает клиент: хэштеги из tags_text,
+цвет нового тега, due_at. Общий для эндпоинтов (routers/crud) и импорта
+(routers/imports), чтобы данные из обоих путей записывались одинаково.
+"""
+import hashlib
+import re
+from datetime import datetime
+from typing import Set
+
+_HASHTAG_PATTERN = re.compile(r"#([A-Za-zА-Яа-я0-9_]+)")
+
+TAG_COLORS = [
+    "#FF6B6B", "#4ECDC4", "#45B7D1", "#FFA07A", "#98D8C8",
+    "#F7DC6F", "#BB8FCE", "#85C1E2", "#F8B739", "#52BE80",
+    "#EC7063", "#5DADE2", "#F4D03F", "#82E0AA", "#F1948A",
+    "#7FB3D3", "#F5B041", "#AED6F1", "#A9DFBF", "#F9E79F"
+]
+
+
+def extract_hashtags(text: str | None) -> Set[str]:
+    """Извлекает имена тегов из текста с хэштегами"""
+    if not text:
+        return set()
+    return {m.group(1).lower() for m in _HASHTAG_PATTERN.finditer(text)}
+
+
+def tag_color(name: str) -> str:
+    """Генерирует цвет на основе имени тега"""
+    hash_int = int(hashlib.md5(name.encode()).hexdigest(), 16)
+    return TAG_COLORS[hash_int % len(TAG_COLORS)]
+
+
+def parse_due_at(value: str | None) -> datetime | None:
+    """SQLite хранит DateTime без часового пояса: отбрасываем его сразу, чтобы ответ
+    совпадал с тем, что вернет чтение из БД"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).replace(tzinfo=None)
@@ -0,0 +1,185 @@
+"""
+Применение дельты к содержимому заметки (PATCH /api/notes/{id}/delta).
+
+Операция text заменяет диапазон [start, end) содержимого на text. Позиции - в
+единицах UTF-16, как индексы строк JavaScript в редакторе: иначе эмодзи и
+другие символы вне BMP сдвигали бы диапазоны.
+
+Остальные операции - JSON Patch (RFC 6902) над todo-JSON заметки
+{"type": "todo", "items": [...]}, например
+{"op": "replace", "path": "/items/3/completed", "value": true}.
+После них содержимое сериализуется компактно, как JSON.stringify на клиенте.
+"""
+import copy
+import json
+from typing import Any, List, Tuple
+
+from ..schemas import NoteDeltaOperation
+
+_NOT_PARSED = object()
+
+
+class NoteDeltaError(ValueError):
+    """Операцию нельзя применить к содержимому"""
+
+
+class NoteDeltaConflict(NoteDeltaError):
+    """Не выполнена операция test: содержимое не то, от которого считалась дельта"""
+
+
+def apply_note_delta(content: str | None, ops: List[NoteDeltaOperation]) -> str | None:
+    """Новое содержимое заметки; ошибки - NoteDeltaError с номером операции"""
+    # Разобранный todo-JSON между подряд идущими JSON-операциями; сериализуем его
+    # обратно, только если операции (кроме test) его меняли
+    document, modified = _NOT_PARSED, False
+    for index, op in enumerate(ops):
+        try:
+            if op.op == "text":
+                if modified:
+                    content = _dump(document)
+                document, modified = _NOT_PARSED, False
+                content = _apply_text(content or "", op)
+            else:
+                if document is _NOT_PARSED:
+                    document = _load(content)
+                document = _apply_json(document, op)
+                modified = modified or op.op != "test"
+        except NoteDeltaError as e:
+            raise type(e)(f"Операция {index}: {e}") from None
+    if modified:
+        content = _dump(document)
+    return content
+
+
+def _load(content: str | None) -> Any:
+    try:
+        return json.loads(content or "")
+    except ValueError:
+        raise NoteDeltaError("содержимое заметки не JSON")
+
+
+def _dump(document: Any) -> str:
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+
+def _apply_text(content: str, op: NoteDeltaOperation) -> str:
+    if op.start is None or op.text is None:
+        raise NoteDeltaError("для text нужны start и text")
+    encoded = content.encode("utf-16-le")
+    length = len(encoded) // 2
+    end = op.start if op.end is None else op.end
+    if not op.start <= end <= length:
+        raise NoteDeltaError(f"диапазон [{op.start}, {end}) вне содержимого длиной {length}")
+    try:
+        # Диапазон не должен разрезать суррогатную пару
+        return (encoded[:op.start * 2] + op.text.encode("utf-16-le") + encoded[end * 2:]).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise NoteDeltaError("диапазон разрезает символ")
+
+
+def _parse_pointer(pointer: str | None) -> List[str]:
+    if pointer is None:
+        raise NoteDeltaError("не указан path")
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise NoteDeltaError(f"некорректный JSON Pointer: {pointer}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, for_insert: bool) -> int:
+    if for_insert and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise NoteDeltaError(f"некорректный индекс массива: {token}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not for_insert):
+        raise NoteDeltaError(f"индекс {index} вне массива длиной {len(container)}")
+    return index
+
+
+def _resolve(document: Any, parts: List[str]) -> Any:
+    for token in parts:
+        if isinstance(document, dict):
+            if token not in document:
+                raise NoteDeltaError(f"нет ключа {token}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_list_index(document, token, False)]
+        else:
+            raise NoteDeltaError(f"путь продолжается внутри значения: {token}")
+    return document
+
+
+def _parent(document: Any, parts: List[str]) -> Tuple[Any, str]:
+    container = _resolve(document, parts[:-1])
+    if not isinstance(container, (dict, list)):
+        raise NoteDeltaError("родитель пути не объект и не массив")
+    return container, parts[-1]
+
+
+def _add(document: Any, parts: List[str], value: Any) -> Any:
+    if not parts:
+        return value
+    container, token = _parent(document, parts)
+    if isinstance(container, list):
+        container.insert(_list_index(container, token, True), value)
+    else:
+        container[token] = value
+    return document
+
+
+def _remove(document: Any, parts: List[str]) -> Tuple[Any, Any]:
+    """(документ, удаленное значение)"""
+    if not parts:
+        raise NoteDeltaError("нельзя удалить документ целиком")
+    container, token = _parent(document, parts)
+    if isinstance(container, list):
+        return document, container.pop(_list_index(container, token, False))
+    if token not in container:
+        raise NoteDeltaError(f"нет ключа {token}")
+    return document, container.pop(token)
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """Равенство JSON-значений по RFC 6902: в отличие от == в Python, true не равно 1,
+    а число - строке или bool. 1 и 1.0 в JSON одно и то же число"""
+    if isinstance(a, bool) or isinstance(b, bool) or a is None or b is None:
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+def _apply_json(document: Any, op: NoteDeltaOperation) -> Any:
+    parts = _parse_pointer(op.path)
+    if op.op == "add":
+        return _add(document, parts, op.value)
+    if op.op == "remove":
+        return _remove(document, parts)[0]
+    if op.op == "replace":
+        _resolve(document, parts)
+        if not parts:
+            return op.value
+        container, token = _parent(document, parts)
+        if isinstance(container, list):
+            container[_list_index(container, token, False)] = op.value
+        else:
+            container[token] = op.value
+        return document
+    if op.op == "test":
+        if not _json_equal(_resolve(document, parts), op.value):
+            raise NoteDeltaConflict(f"значение {op.path} не совпадает")
+        return document
+    source = _parse_pointer(op.from_)
+    if op.op == "move":
+        if parts[:len(source)] == source and parts != source:
+            raise NoteDeltaError("нельзя переместить значение внутрь него самого")
+        document, value = _remove(document, source)
+        return _add(document, parts, value)
+    # copy
+    return _add(document, parts, copy.deepcopy(_resolve(document, source)))
@@ -0,0 +1,353 @@
+"""
+Отложенная запись автосохранений заметок (NOTE_WRITE_BEHIND=1).
+
+Редактор во время набора отправляет PATCH /api/notes/{id} по несколько раз в
+секунду, и каждый запрос - отдельный коммит. С включенным буфером title и content
+таких запросов сохраняются в памяти процесса (последнее значение на заметку), а
+в БД попадают одной транзакцией: когда заметку перестали править на
+NOTE_WRITE_BEHIND_IDLE_MS, не позже NOTE_WRITE_BEHIND_INTERVAL_MS после первой
+несохраненной правки и при остановке приложения.
+
+Чтение видит несохраненные правки, но буфер не сбрасывает (GET ничего не
+пишет): заметка, списки, дедлайны, синхронизация и выгрузка подставляют их из
+буфера (user_pending, overlay_note_json), а версия последней правки входит в
+ETag (pending_version). Поиск идет по индексу FTS и находит новый текст после
+сброса. Запись, которая меняет заметку сразу (PATCH с другими полями,
+дельта, удаление, пакет операций), забирает правки из буфера в свою транзакцию.
+Каждая отложенная правка получает свою версию (NoteOut.version): дельта
+принимается только от последней из них, а от change_seq до правок или от
+промежуточной версии - 409. Сброс дает заметке новый change_seq, но последняя
+версия из буфера остается действительной (is_current_version). Правки, которые БД
+отвергла (например, NOT NULL), отбрасываются по одной заметке и учитываются в
+rejected_writes, не задерживая остальные.
+
+Буфер - память одного процесса: включать только при одном воркере uvicorn.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import SessionLocal
+from ..models.todo import Note, todo_stats
+from .sync_service import change_seq
+
+logger = logging.getLogger(__name__)
+
+_CLAIMED_KEY = "claimed_note_writes"
+
+# Поля заметки, изменения которых можно отложить
+BUFFERED_FIELDS = ("title", "content")
+
+# Версии отложенных правок не должны совпадать с change_seq (он растет от 1) и с
+# версиями прошлого запуска: начинаем с 2**52 плюс текущее время в микросекундах
+# (до 2**53 - без потери точности в JavaScript)
+_VERSION_BASE = 1 << 52
+
+
+@dataclass
+class _PendingWrite:
+    user_id: int
+    fields: Dict[str, Optional[str]]
+    first_at: float  # Первая несохраненная правка (для задержки записи)
+    last_at: float  # Последняя правка (для сброса по простою)
+    version: int  # Версия последней правки, ее отдает NoteOut.version
+    generation: int = 0  # Растет с каждой правкой: по нему видно, что после чтения буфера пришли новые
+    claims: int = 0  # Сколько открытых транзакций забрали правки себе; такие записи не сбрасываются
+
+
+class NoteWriteBuffer:
+    def __init__(self, enabled: bool, interval: float, idle: float, max_notes: int):
+        self.enabled = enabled
+        self.interval = interval
+        self.idle = idle
+        self.max_notes = max_notes
+        self._entries: Dict[int, _PendingWrite] = {}
+        # note_id -> (версия последней записанной правки, change_seq после сброса):
+        # сброс меняет версию заметки без участия клиента, и дельта от версии
+        # правки еще верна
+        self._flushed: "OrderedDict[int, Tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_version = _VERSION_BASE + time.time_ns() // 1000
+        # Одновременно идет один сброс; захват правок транзакцией ждет его окончания
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._buffered = 0
+        self._coalesced = 0
+        self._write_through = 0
+        self._flushes = 0
+        self._flushed_notes = 0
+        self._flush_errors = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="note-write-buffer", daemon=True)
+        self._thread.start()
+        logger.info("Автосохранения заметок записываются в БД с задержкой (NOTE_WRITE_BEHIND)")
+
+    def stop(self) -> None:
+        """Останавливает фоновый сброс и записывает все, что осталось в буфере"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        if self._entries:
+            logger.error(f"При остановке не записаны правки {len(self._entries)} заметок")
+
+    def put(self, user_id: int, note_id: int, fields: Dict[str, Optional[str]]) -> int | None:
+        """Откладывает запись полей заметки и возвращает версию правки.
+        None - буфер заполнен, писать нужно сразу"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(note_id)
+            if entry is None:
+                if len(self._entries) >= self.max_notes:
+                    self._write_through += 1
+                    return None
+                entry = self._entries[note_id] = _PendingWrite(user_id, {}, now, now, 0)
+            else:
+                self._coalesced += 1
+            self._last_version += 1
+            entry.fields.update(fields)
+            entry.last_at = now
+            entry.version = self._last_version
+            entry.generation += 1
+            self._buffered += 1
+            return entry.version
+
+    def pending(self, note_id: int) -> Dict[str, Any] | None:
+        """Несохраненные поля заметки и версия последней правки (для NoteOut) или None"""
+        with self._lock:
+            entry = self._entries.get(note_id)
+            return {**entry.fields, "version": entry.version} if entry is not None else None
+
+    def user_pending(self, user_id: int) -> Dict[int, Dict[str, Any]]:
+        """Несохраненные правки заметок пользователя: {note_id: поля и version}"""
+        if not self._entries:
+            return {}
+        with self._lock:
+            return {
+                note_id: {**entry.fields, "version": entry.version}
+                for note_id, entry in self._entries.items()
+                if entry.user_id == user_id
+            }
+
+    def pending_version(self, user_id: int) -> int:
+        """Версия последней несохраненной правки пользователя (0, если правок нет)"""
+        if not self._entries:
+            return 0
+        with self._lock:
+            return max((entry.version for entry in self._entries.values() if entry.user_id == user_id), default=0)
+
+    def is_current_version(self, note_id: int, base_version: int, current_version: int) -> bool:
+        """Можно ли считать base_version клиента текущей версией заметки.
+
+        Пока в буфере есть правки заметки - только если это версия последней из
+        них. Иначе - если base_version равна current_version или current_version
+        заметка получила от сброса буфера, а base_version - версия последней
+        записанной правки: содержимое у клиента и в БД совпадает.
+        """
+        with self._lock:
+            entry = self._entries.get(note_id)
+            if entry is not None:
+                return base_version == entry.version
+            if base_version == current_version:
+                return True
+            return self._flushed.get(note_id) == (base_version, current_version)
+
+    def claim(self, db: Session, note: Note) -> None:
+        """Переносит несохраненные правки в объект заметки транзакции db.
+
+        После коммита db они удаляются из буфера (если за это время не пришли
+        новые), после отката - снова будут записаны фоновым сбросом.
+        """
+        if note.id not in self._entries:
+            return
+        with self._flush_lock, self._lock:
+            entry = self._entries.get(note.id)
+            if entry is None:
+                return
+            entry.claims += 1
+            for name, value in entry.fields.items():
+                setattr(note, name, value)
+            db.info.setdefault(_CLAIMED_KEY, []).append((note.id, entry.generation))
+
+    def flush(self, user_id: int | None = None) -> None:
+        """Записывает отложенные правки (всех или одного пользователя) одной транзакцией"""
+        if not self._entries:
+            return
+        with self._flush_lock:
+            with self._lock:
+                batch = [
+                    (note_id, entry.user_id, entry.generation, dict(entry.fields), entry.first_at, entry.version)
+                    for note_id, entry in self._entries.items()
+                    if entry.claims == 0 and (user_id is None or entry.user_id == user_id)
+                ]
+            if not batch:
+                return
+            rejected: Set[int] = set()
+            try:
+                written, missing = self._write(batch)
+            except (IntegrityError, DataError) as e:
+                # Недопустимые значения одной заметки не должны задерживать правки
+                # остальных: пишем по одной, а отклоненные правки отбрасываем
+                logger.error(f"Не удалось записать отложенные правки заметок одной транзакцией: {e}")
+                written, missing = {}, set()
+                for item in batch:
+                    try:
+                        note_written, note_missing = self._write([item])
+                    except (IntegrityError, DataError) as e:
+                        logger.error(f"Отброшены отложенные правки заметки {item[0]}: {e}")
+                        rejected.add(item[0])
+                        continue
+                    except Exception as e:
+                        with self._lock:
+                            self._flush_errors += 1
+                        logger.error(f"Не удалось записать отложенные правки заметки {item[0]}: {e}")
+                        continue
+                    written.update(note_written)
+                    missing |= note_missing
+            except Exception as e:
+                with self._lock:
+                    self._flush_errors += 1
+                logger.error(f"Не удалось записать отложенные правки заметок: {e}")
+                return
+
+            now = time.monotonic()
+            with self._lock:
+                for note_id, _, generation, _, first_at, version in batch:
+                    if note_id not in written and note_id not in missing and note_id not in rejected:
+                        continue
+                    entry = self._entries.get(note_id)
+                    if entry is not None and entry.generation == generation:
+                        del self._entries[note_id]
+                    elif entry is not None:
+                        # Пока шла запись, пришли новые правки: задержку считаем от сброса
+                        entry.first_at = now
+                    if note_id in written:
+                        self._flushed[note_id] = (version, written[note_id])
+                        self._flushed.move_to_end(note_id)
+                        self._last_lag = now - first_at
+                        self._max_lag = max(self._max_lag, self._last_lag)
+                while len(self._flushed) > self.max_notes:
+                    self._flushed.popitem(last=False)
+                self._flushes += 1
+                self._flushed_notes += len(written)
+                self._dropped += len(missing) + len(rejected)
+                self._rejected += len(rejected)
+
+    def _write(self, batch: list) -> Tuple[Dict[int, int], Set[int]]:
+        """Пишет правки одной транзакцией: ({note_id: новый change_seq}, id удаленных заметок)"""
+        written: Dict[int, int] = {}
+        missing: Set[int] = set()
+        db = SessionLocal()
+        try:
+            for note_id, owner_id, _, fields, _, _ in batch:
+                values = dict(fields)
+                if "content" in values:
+                    values["note_kind"], values["todo_total"], values["todo_done"] = todo_stats(values["content"])
+                values["change_seq"] = change_seq(db, owner_id)
+                result = db.execute(
+                    update(Note).where(Note.id == note_id, Note.user_id == owner_id).values(values)
+                )
+                if result.rowcount:
+                    written[note_id] = values["change_seq"]
+                else:
+                    # Заметку удалили в обход буфера (например, другой процесс)
+                    missing.add(note_id)
+            db.commit()
+        finally:
+            db.close()
+        return written, missing
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            oldest = min((entry.first_at for entry in self._entries.values()), default=None)
+            return {
+                "enabled": self.enabled,
+                "pending_notes": len(self._entries),
+                "pending_age_ms": round((now - oldest) * 1000) if oldest is not None else 0,
+                "buffered_writes": self._buffered,
+                "coalesced_writes": self._coalesced,
+                "write_through": self._write_through,
+                "flushes": self._flushes,
+                "flushed_notes": self._flushed_notes,
+                "flush_errors": self._flush_errors,
+                "dropped_writes": self._dropped,
+                "rejected_writes": self._rejected,
+                "last_flush_lag_ms": round(self._last_lag * 1000),
+                "max_flush_lag_ms": round(self._max_lag * 1000),
+            }
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            return any(
+                entry.claims == 0 and (now - entry.last_at >= self.idle or now - entry.first_at >= self.interval)
+                for entry in self._entries.values()
+            )
+
+    def _run(self) -> None:
+        # Сбрасываем сразу все накопленное: число коммитов не зависит от числа
+        # пользователей и не больше одного за период опроса
+        tick = min(self.interval, self.idle) / 2
+        while not self._stopped.wait(tick):
+            if self._due():
+                self.flush()
+
+    def _release(self, session: Session, committed: bool) -> None:
+        claimed = session.info.pop(_CLAIMED_KEY, ())
+        if not claimed:
+            return
+        with self._lock:
+            for note_id, generation in claimed:
+                entry = self._entries.get(note_id)
+                if entry is None:
+                    continue
+                entry.claims -= 1
+                if committed and entry.generation == generation:
+                    del self._entries[note_id]
+
+
+def overlay_note_json(body: str, pending: Dict[str, Any]) -> str:
+    """JSON заметки из projections.note_json с несохраненными правками"""
+    note = json.loads(body)
+    note.update(pending)
+    # Так же компактно, как json_object в SQLite
+    return json.dumps(note, ensure_ascii=False, separators=(",", ":"))
+
+
+note_write_buffer = NoteWriteBuffer(
+    enabled=settings.note_write_behind,
+    interval=settings.note_write_behind_interval_ms / 1000,
+    idle=settings.note_write_behind_idle_ms / 1000,
+    max_notes=settings.note_write_behind_max_notes,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session) -> None:
+    note_write_buffer._release(session, committed=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session) -> None:
+    note_write_buffer._release(session, committed=False)
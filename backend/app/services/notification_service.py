@@ -2,17 +2,18 @@
 Сервис для отправки уведомлений о дедлайнах через планировщик задач.
 """
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 
 from ..db import SessionLocal
-from ..models.todo import Deadline, DeadlineNotification, Note
+from ..models.todo import Deadline, DeadlineNotification, Note, NOTE_KIND_TODO
 from ..models.user import User
 from ..models.user_settings import UserSettings
 from .bot_service import send_message_to_user
+from .events import EVENT_DEADLINE_STATUS, EVENT_REMINDER, event_broker
 from .message_tracker import track_message
 
 logger = logging.getLogger(__name__)
@@ -32,6 +33,12 @@ DEFAULT_NOTIFICATION_GRADATIONS = [
 
 scheduler: Optional[BackgroundScheduler] = None
 
+# Время предыдущей проверки статусов дедлайнов (naive UTC)
+_last_status_check: Optional[datetime] = None
+
+# За сколько до дедлайна он получает статус today (как в calculate_deadline_info)
+TODAY_WINDOW = timedelta(hours=24)
+
 
 def get_time_until_deadline(deadline_at: datetime) -> timedelta:
     """Вычисляет время до дедлайна."""
@@ -69,48 +76,81 @@ def format_time_remaining(minutes: int) -> str:
         return f"{minutes} {'минута' if minutes == 1 else 'минуты' if 2 <= minutes <= 4 else 'минут'}"
 
 
+def publish_deadline_status_changes(db: Session, now: datetime) -> None:
+    """Публикует события deadline_status для дедлайнов, которые с прошлой проверки
+    стали today (до дедлайна меньше 24 часов) или overdue (дедлайн прошел).
+
+    Статус зависит только от времени, поэтому записывающие эндпоинты о таком
+    переходе не знают - его замечает планировщик.
+    """
+    global _last_status_check
+    now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    since = _last_status_check or now - timedelta(minutes=1)
+    _last_status_check = now
+    if since >= now:
+        return
+
+    crossings = []
+    for status, start, end in (
+        ("overdue", since, now),
+        ("today", since + TODAY_WINDOW, now + TODAY_WINDOW),
+    ):
+        rows = db.query(Deadline.id, Deadline.note_id, Deadline.user_id).filter(
+            Deadline.deadline_at >= start,
+            Deadline.deadline_at < end
+        ).all()
+        crossings.extend((status, row) for row in rows)
+
+    for status, (deadline_id, note_id, user_id) in crossings:
+        event_broker.publish(user_id, EVENT_DEADLINE_STATUS, {
+            "deadline_id": deadline_id,
+            "note_id": note_id,
+            "status": status,
+        })
+
+
+def _publish_reminder(deadline: Deadline, notification_type: str) -> None:
+    event_broker.publish(deadline.user_id, EVENT_REMINDER, {
+        "deadline_id": deadline.id,
+        "note_id": deadline.note_id,
+        "notification_type": notification_type,
+    })
+
+
 def check_and_send_notifications():
     """Проверяет дедлайны и отправляет уведомления при необходимости."""
-    from datetime import timezone
     db = SessionLocal()
     try:
         now = datetime.now(timezone.utc)
         
+        try:
+            publish_deadline_status_changes(db, now)
+        except Exception as e:
+            logger.error(f"Ошибка при проверке статусов дедлайнов: {e}")
+        
         # Проверяем ВСЕ просроченные дедлайны, для которых еще не было отправлено уведомление
         # Получаем все просроченные дедлайны
-        all_expired_deadlines = db.query(Deadline).filter(
+        # Уведомления только для todo-заметок: вид заметки хранится в notes.note_kind
+        all_expired_deadlines = db.query(Deadline, Note).join(Note, Note.id == Deadline.note_id).filter(
             Deadline.notification_enabled == True,
-            Deadline.deadline_at <= now
+            Deadline.deadline_at <= now,
+            Note.note_kind == NOTE_KIND_TODO
         ).all()
         
         # Фильтруем только те, для которых еще не было отправлено уведомление об окончании
         expired_deadlines = []
-        for deadline in all_expired_deadlines:
+        for deadline, note in all_expired_deadlines:
             existing_notification = db.query(DeadlineNotification).filter(
                 DeadlineNotification.deadline_id == deadline.id,
                 DeadlineNotification.notification_type == "expired"
             ).first()
             if not existing_notification:
-                expired_deadlines.append(deadline)
+                expired_deadlines.append((deadline, note))
         
         # Отправляем уведомления об окончании дедлайнов
-        for deadline in expired_deadlines:
+        for deadline, note in expired_deadlines:
             try:
-                
-                # Получаем заметку и пользователя
-                note = db.query(Note).filter(Note.id == deadline.note_id).first()
-                if not note:
-                    continue
-                
-                # Проверяем, что заметка является todo
-                try:
-                    import json
-                    parsed = json.loads(note.content or "{}")
-                    if parsed.get("type") != "todo" or not isinstance(parsed.get("items"), list):
-                        continue
-                except:
-                    continue
-                
+                # Получаем пользователя
                 user = db.query(User).filter(User.id == deadline.user_id).first()
                 if not user:
                     continue
@@ -133,6 +173,7 @@ def check_and_send_notifications():
                     )
                     db.add(notification)
                     db.commit()
+                    _publish_reminder(deadline, "expired")
                     logger.info(f"Уведомление об окончании дедлайна {deadline.id} отправлено")
                 else:
                     error_code = result.get("error_code")
@@ -144,27 +185,15 @@ def check_and_send_notifications():
                 continue
         
         # Находим все активные дедлайны с включенными уведомлениями (еще не истекшие)
-        deadlines = db.query(Deadline).filter(
+        deadlines = db.query(Deadline, Note).join(Note, Note.id == Deadline.note_id).filter(
             Deadline.notification_enabled == True,
-            Deadline.deadline_at > now
+            Deadline.deadline_at > now,
+            Note.note_kind == NOTE_KIND_TODO
         ).all()
         
-        for deadline in deadlines:
+        for deadline, note in deadlines:
             try:
-                # Получаем заметку и пользователя
-                note = db.query(Note).filter(Note.id == deadline.note_id).first()
-                if not note:
-                    continue
-                
-                # Проверяем, что заметка является todo
-                try:
-                    import json
-                    parsed = json.loads(note.content or "{}")
-                    if parsed.get("type") != "todo" or not isinstance(parsed.get("items"), list):
-                        continue
-                except:
-                    continue
-                
+                # Получаем пользователя
                 user = db.query(User).filter(User.id == deadline.user_id).first()
                 if not user:
                     continue
@@ -243,6 +272,7 @@ def check_and_send_notifications():
                             )
                             db.add(notification)
                             db.commit()
+                            _publish_reminder(deadline, notification_type)
                             logger.info(f"Уведомление отправлено для дедлайна {deadline.id}")
                             # Прерываем цикл после отправки первого подходящего уведомления
                             break
@@ -0,0 +1,139 @@
+"""
+Кэш сериализованных ответов списков в памяти процесса.
+
+Ключ - (user_id, ETag). ETag содержит версию данных пользователя, поэтому запись
+не может устареть: после любого изменения версия другая и ключ тоже. Старые
+записи пользователя удаляются invalidate_user после коммита изменяющей
+транзакции (см. sync_service), остальное вытесняется по LRU, TTL и лимиту памяти.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from ..core.config import settings
+
+_serializer = TypeAdapter(Any)
+
+CacheKey = Tuple[int, str]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, Tuple[bytes, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[CacheKey]] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def set(self, key: CacheKey, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, time.monotonic() + self.ttl_seconds)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Удаляет все ответы пользователя. Вызывается после коммита любого изменения."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "memory_usage_ratio": self._bytes / self.max_bytes if self.max_bytes else 0.0,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+    def _remove(self, key: CacheKey) -> None:
+        body, _ = self._entries.pop(key)
+        self._bytes -= len(body)
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
+
+
+class CachedList:
+    """Кэшируемый ответ списка для одного запроса (создается зависимостью conditional_get)"""
+
+    def __init__(self, user_id: int, etag: str, headers: Dict[str, str]):
+        self.user_id = user_id
+        self.etag = etag
+        self.headers = headers
+
+    @property
+    def key(self) -> CacheKey:
+        return (self.user_id, self.etag)
+
+    def lookup(self) -> Optional[Response]:
+        """Готовый ответ из кэша или None"""
+        if not settings.response_cache_enabled:
+            return None
+        body = response_cache.get(self.key)
+        if body is None:
+            return None
+        return self._response(body)
+
+    def store(self, result: Any) -> Response:
+        """Сериализует результат (pydantic-модели, списки, None) и кладет в кэш"""
+        return self.store_body(_serializer.dump_json(result))
+
+    def store_body(self, body: bytes) -> Response:
+        """Кладет в кэш уже готовое JSON-тело ответа"""
+        if settings.response_cache_enabled:
+            response_cache.set(self.key, body)
+        return self._response(body)
+
+    def _response(self, body: bytes) -> Response:
+        return Response(content=body, media_type="application/json", headers=self.headers)
@@ -0,0 +1,147 @@
+"""
+Полнотекстовый поиск по заметкам и задачам (SQLite FTS5).
+
+notes_fts и tasks_fts - виртуальные таблицы с rowid = id заметки/задачи.
+Они поддерживаются триггерами на notes/tasks, поэтому индекс обновляется при
+любом способе записи (эндпоинты, /batch, bulk-update). У todo-заметок
+индексируется текст пунктов, а не JSON целиком.
+"""
+import html
+import logging
+import re
+from typing import List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+SNIPPET_TOKENS = 12
+# Вес совпадения в заголовке относительно текста (bm25)
+TITLE_WEIGHT = 5.0
+# Границы совпадений в snippet(): управляющие символы, которых нет в тексте заметок.
+# HTML-разметку <mark> добавляем только после экранирования текста
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+
+def _note_body_sql(column: str) -> str:
+    """SQL-выражение индексируемого текста заметки: у todo - текст пунктов через пробел"""
+    return f"""CASE
+        WHEN json_valid({column})
+             AND json_extract({column}, '$.type') = 'todo'
+             AND json_type({column}, '$.items') = 'array'
+        THEN (SELECT group_concat(json_extract(value, '$.text'), ' ') FROM json_each({column}, '$.items'))
+        ELSE {column}
+    END"""
+
+
+_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(title, body, tokenize='{TOKENIZER}')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(title, body, tokenize='{TOKENIZER}')",
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, {_note_body_sql("new.content")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = old.id;
+        INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, {_note_body_sql("new.content")});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, body) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        DELETE FROM tasks_fts WHERE rowid = old.id;
+        INSERT INTO tasks_fts(rowid, title, body) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM tasks_fts WHERE rowid = old.id;
+    END""",
+]
+
+
+def rebuild_search_index(conn) -> None:
+    """Заполняет индекс заново по текущим notes и tasks"""
+    conn.execute(text("DELETE FROM notes_fts"))
+    conn.execute(text(
+        f"INSERT INTO notes_fts(rowid, title, body) SELECT id, title, {_note_body_sql('content')} FROM notes"
+    ))
+    conn.execute(text("DELETE FROM tasks_fts"))
+    conn.execute(text("INSERT INTO tasks_fts(rowid, title, body) SELECT id, title, description FROM tasks"))
+    conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('optimize')"))
+    conn.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('optimize')"))
+
+
+def ensure_search_index(engine) -> None:
+    """Создает таблицы FTS5 и триггеры; при первом создании заполняет индекс существующими данными"""
+    is_new = "notes_fts" not in inspect(engine).get_table_names()
+    with engine.begin() as conn:
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if is_new:
+            rebuild_search_index(conn)
+            logger.info("Создан полнотекстовый индекс notes_fts/tasks_fts")
+
+
+def build_match_query(q: str) -> str | None:
+    """Превращает ввод пользователя в запрос FTS5.
+
+    Каждое слово берется в кавычки (операторы FTS5 во вводе не работают),
+    последнее слово ищется по префиксу - для поиска по мере набора.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight_snippet(snippet: str | None) -> str:
+    """Фрагмент из search() в HTML: текст экранирован, совпадения в <mark>...</mark>"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+
+
+def search(
+    db: Session,
+    user_id: int,
+    match: str,
+    entity: str | None,
+    limit: int,
+    after: Tuple[float, str, int] | None,
+) -> List[tuple]:
+    """Найденные заметки и задачи пользователя: (score, entity, id, title, snippet).
+
+    Сортировка по убыванию score (-bm25), затем entity и id - это ключ
+    keyset-пагинации, after - последняя строка предыдущей страницы.
+    """
+    parts = []
+    if entity in (None, "note"):
+        parts.append(f"""
+            SELECT -bm25(notes_fts, {TITLE_WEIGHT}, 1.0) AS score, 'note' AS entity, notes.id AS id, notes.title AS title,
+                   snippet(notes_fts, -1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet
+            FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid
+            WHERE notes_fts MATCH :match AND notes.user_id = :user_id""")
+    if entity in (None, "task"):
+        parts.append(f"""
+            SELECT -bm25(tasks_fts, {TITLE_WEIGHT}, 1.0) AS score, 'task' AS entity, tasks.id AS id, tasks.title AS title,
+                   snippet(tasks_fts, -1, char(2), char(3), '…', {SNIPPET_TOKENS}) AS snippet
+            FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+            WHERE tasks_fts MATCH :match AND tasks.user_id = :user_id""")
+
+    params = {"match": match, "user_id": user_id, "limit": limit}
+    where = ""
+    if after is not None:
+        where = "WHERE (score, entity, id) < (:after_score, :after_entity, :after_id)"
+        params.update(after_score=after[0], after_entity=after[1], after_id=after[2])
+
+    sql = f"""
+        SELECT score, entity, id, title, snippet FROM ({" UNION ALL ".join(parts)})
+        {where}
+        ORDER BY score DESC, entity DESC, id DESC
+        LIMIT :limit"""
+    return db.execute(text(sql), params).all()
@@ -0,0 +1,127 @@
+"""
+Номера изменений и "надгробия" для дельта-синхронизации (GET /api/sync).
+
+Каждая транзакция, изменяющая данные пользователя, получает следующий номер из
+sync_state и проставляет его в change_seq измененных объектов. Удаления
+записываются в tombstones с тем же номером.
+"""
+from typing import Dict, List
+
+from sqlalchemy import event, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..db import Base
+from ..models.sync import SyncState, Tombstone
+from .response_cache import response_cache
+
+_SEQ_KEY = "sync_seq"
+_CHANGES_KEY = "sync_changes"
+
+# Имена сущностей в tombstones и событиях по таблицам с колонкой change_seq
+ENTITY_NAMES = {
+    "notes": "note",
+    "tasks": "task",
+    "folders": "folder",
+    "deadlines": "deadline",
+    "user_settings": "settings",
+}
+
+# Вызываются после коммита с сессией, {user_id: номер изменения} этой транзакции
+# и {user_id: [{"entity", "id", "deleted"}, ...]} - что именно изменилось
+_commit_listeners = []
+
+
+def on_user_commit(listener):
+    """Регистрирует обработчик закоммиченных изменений (для производных структур в памяти и событий)"""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def current_seq(db: Session, user_id: int) -> int:
+    """Последний закоммиченный номер изменения пользователя (0, если изменений не было)"""
+    seq = db.execute(select(SyncState.seq).where(SyncState.user_id == user_id)).scalar()
+    return seq or 0
+
+
+def change_seq(db: Session, user_id: int) -> int:
+    """Номер изменения текущей транзакции.
+
+    Выделяется один раз на транзакцию: все изменения одного запроса получают
+    одинаковый номер. Используется напрямую в bulk-update запросах.
+    """
+    allocated = db.info.setdefault(_SEQ_KEY, {})
+    if user_id not in allocated:
+        stmt = insert(SyncState).values(user_id=user_id, seq=1)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SyncState.user_id],
+            set_={"seq": SyncState.seq + 1},
+        ).returning(SyncState.seq)
+        allocated[user_id] = db.execute(stmt).scalar_one()
+    return allocated[user_id]
+
+
+def mark_changed(db: Session, user_id: int, *items) -> None:
+    """Помечает созданные или измененные объекты номером текущей транзакции"""
+    seq = change_seq(db, user_id)
+    for item in items:
+        if item is not None:
+            item.change_seq = seq
+
+
+def mark_deleted(db: Session, user_id: int, entity: str, entity_id: int) -> None:
+    """Записывает удаление объекта ("note", "task", "folder", "deadline")"""
+    db.add(Tombstone(user_id=user_id, entity=entity, entity_id=entity_id, seq=change_seq(db, user_id)))
+
+
+def _stamped_changes(session: Session, user_id: int, seq: int) -> List[dict]:
+    """Что изменила транзакция: строки с ее change_seq и надгробия с ее номером.
+
+    Берется из БД, а не из объектов mark_changed, чтобы учесть и bulk-update
+    запросы (перенос заметок из удаленной папки, флаги дедлайнов, импорт).
+    Один запрос по индексам (user_id, change_seq) таблиц.
+    """
+    parts = [
+        select(literal(entity).label("entity"), table.c.id.label("id"), literal(False).label("deleted"))
+        .where(table.c.user_id == user_id, table.c.change_seq == seq)
+        for table, entity in ((Base.metadata.tables[name], entity) for name, entity in ENTITY_NAMES.items())
+    ]
+    parts.append(
+        select(Tombstone.entity, Tombstone.entity_id, literal(True))
+        .where(Tombstone.user_id == user_id, Tombstone.seq == seq)
+    )
+    changes: Dict[tuple, dict] = {}
+    for entity, entity_id, deleted in session.execute(union_all(*parts)):
+        # Удаление в той же транзакции важнее изменения
+        if (entity, entity_id) not in changes or deleted:
+            changes[(entity, entity_id)] = {"entity": entity, "id": entity_id, "deleted": bool(deleted)}
+    return list(changes.values())
+
+
+@event.listens_for(Session, "before_commit")
+def _on_before_commit(session: Session) -> None:
+    allocated = session.info.get(_SEQ_KEY)
+    if not allocated:
+        return
+    # Сессии без autoflush: изменения объектов должны попасть в БД до выборки
+    session.flush()
+    session.info[_CHANGES_KEY] = {
+        user_id: _stamped_changes(session, user_id, seq) for user_id, seq in allocated.items()
+    }
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session) -> None:
+    # Номер выделяется заново в каждой транзакции
+    changed_users = session.info.pop(_SEQ_KEY, {})
+    changes = session.info.pop(_CHANGES_KEY, {})
+    for user_id in changed_users:
+        response_cache.invalidate_user(user_id)
+    for listener in _commit_listeners:
+        listener(session, changed_users, changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session) -> None:
+    session.info.pop(_SEQ_KEY, None)
+    session.info.pop(_CHANGES_KEY, None)
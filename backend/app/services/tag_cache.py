@@ -0,0 +1,77 @@
+"""
+Словарь тегов в памяти процесса: id -> (name, color).
+
+Таблица tags общая для всех пользователей и маленькая, имя и цвет тега после
+создания не меняются, а сами строки не удаляются, так что id не переиспользуется
+(см. tag_usage). Поэтому связи note_tag/task_tag читаются только как пары id,
+а имена и цвета берутся отсюда. Неизвестные id догружаются из БД при
+первом обращении.
+"""
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.todo import Tag, note_tag, task_tag
+from ..schemas import TagOut
+
+
+class TagCache:
+    def __init__(self):
+        self._tags: Dict[int, Tuple[str, str | None]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, db: Session, tag_ids: Iterable[int]) -> List[TagOut]:
+        """Теги по списку id (в том же порядке)"""
+        tag_ids = list(tag_ids)
+        self.load(db, tag_ids)
+        result = []
+        for tag_id in tag_ids:
+            entry = self._tags.get(tag_id)
+            if entry is not None:
+                result.append(TagOut(id=tag_id, name=entry[0], color=entry[1]))
+        return result
+
+    def load(self, db: Session, tag_ids: Iterable[int]) -> None:
+        """Догружает из БД теги, которых еще нет в словаре (одним запросом)"""
+        missing = {tag_id for tag_id in tag_ids if tag_id not in self._tags}
+        if not missing:
+            return
+        rows = db.execute(select(Tag.id, Tag.name, Tag.color).where(Tag.id.in_(missing))).all()
+        with self._lock:
+            for tag_id, name, color in rows:
+                self._tags[tag_id] = (name, color)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tags.clear()
+
+
+tag_cache = TagCache()
+
+
+def _tags_by_owner(db: Session, association_table, owner_column: str, owner_ids: List[int]) -> Dict[int, List[TagOut]]:
+    if not owner_ids:
+        return {}
+    owner = association_table.c[owner_column]
+    rows = db.execute(
+        select(owner, association_table.c.tag_id)
+        .where(owner.in_(owner_ids))
+        .order_by(owner, association_table.c.tag_id)
+    ).all()
+    ids_by_owner: Dict[int, List[int]] = {}
+    for owner_id, tag_id in rows:
+        ids_by_owner.setdefault(owner_id, []).append(tag_id)
+    tag_cache.load(db, (tag_id for _, tag_id in rows))
+    return {owner_id: tag_cache.resolve(db, tag_ids) for owner_id, tag_ids in ids_by_owner.items()}
+
+
+def note_tags(db: Session, note_ids: List[int]) -> Dict[int, List[TagOut]]:
+    """Теги заметок одним запросом по note_tag: note_id -> [TagOut]"""
+    return _tags_by_owner(db, note_tag, "note_id", note_ids)
+
+
+def task_tags(db: Session, task_ids: List[int]) -> Dict[int, List[TagOut]]:
+    """Теги задач одним запросом по task_tag: task_id -> [TagOut]"""
+    return _tags_by_owner(db, task_tag, "task_id", task_ids)
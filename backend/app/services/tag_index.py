@@ -0,0 +1,164 @@
+"""
+Инвертированный индекс тегов в памяти процесса: тег -> отсортированный массив id.
+
+Для каждого пользователя и вида объектов (заметки или задачи) индекс строится
+при первом фильтре по тегам одним запросом к note_tag/task_tag, а дальше
+обновляется изменениями тегов, закоммиченными в этом процессе.
+
+Индекс помечен номером изменения пользователя (sync_state.seq), которому он
+соответствует. Коммит транзакции с номером seq продвигает метку с seq - 1 до seq,
+применяя изменения тегов этой транзакции. Если номера идут не подряд (данные
+менял другой процесс), индекс пользователя сбрасывается и при следующем
+обращении строится заново.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.todo import Note, Task, note_tag, task_tag
+from .sync_service import change_seq, current_seq, on_user_commit
+
+_CHANGES_KEY = "tag_index_changes"
+
+MODE_ANY = "any"
+MODE_ALL = "all"
+
+# (user_id, is_note)
+IndexKey = Tuple[int, bool]
+
+
+class _UserIndex:
+    def __init__(self, seq: int, postings: Dict[int, array]):
+        self.seq = seq
+        self.postings = postings
+
+    def add(self, tag_id: int, item_id: int) -> None:
+        ids = self.postings.setdefault(tag_id, array("q"))
+        position = bisect_left(ids, item_id)
+        if position == len(ids) or ids[position] != item_id:
+            insort(ids, item_id)
+
+    def remove(self, tag_id: int, item_id: int) -> None:
+        ids = self.postings.get(tag_id)
+        if ids is None:
+            return
+        position = bisect_left(ids, item_id)
+        if position < len(ids) and ids[position] == item_id:
+            del ids[position]
+        if not ids:
+            del self.postings[tag_id]
+
+    def match(self, tag_ids: List[int], mode: str) -> List[int]:
+        lists = [self.postings.get(tag_id, array("q")) for tag_id in tag_ids]
+        if mode == MODE_ANY:
+            return sorted(set().union(*lists))
+        # Пересечение: идем по самому короткому списку и ищем его id в остальных
+        lists.sort(key=len)
+        result = []
+        for item_id in lists[0]:
+            for ids in lists[1:]:
+                position = bisect_left(ids, item_id)
+                if position == len(ids) or ids[position] != item_id:
+                    break
+            else:
+                result.append(item_id)
+        return result
+
+
+class TagIndex:
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[IndexKey, _UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def match(self, db: Session, user_id: int, is_note: bool, tag_ids: List[int], mode: str) -> List[int]:
+        """Отсортированные id заметок (is_note) или задач пользователя с любым (any)
+        или со всеми (all) тегами из tag_ids"""
+        key = (user_id, is_note)
+        seq = current_seq(db, user_id)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and index.seq == seq:
+                self._indexes.move_to_end(key)
+                return index.match(tag_ids, mode)
+
+        index = _UserIndex(seq, self._load(db, user_id, is_note))
+        with self._lock:
+            # Сохраняем, только если за время загрузки коммит не обновил индекс
+            current = self._indexes.get(key)
+            if current is None or current.seq < seq:
+                self._indexes[key] = index
+                self._indexes.move_to_end(key)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        return index.match(tag_ids, mode)
+
+    @staticmethod
+    def _load(db: Session, user_id: int, is_note: bool) -> Dict[int, array]:
+        if is_note:
+            owner, association_table, owner_column = Note, note_tag, note_tag.c.note_id
+        else:
+            owner, association_table, owner_column = Task, task_tag, task_tag.c.task_id
+        rows = db.execute(
+            select(association_table.c.tag_id, owner_column)
+            .join(owner, owner.id == owner_column)
+            .where(owner.user_id == user_id)
+            .order_by(association_table.c.tag_id, owner_column)
+        ).all()
+        postings: Dict[int, array] = {}
+        for tag_id, item_id in rows:
+            postings.setdefault(tag_id, array("q")).append(item_id)
+        return postings
+
+    def record(self, db: Session, user_id: int, is_note: bool, item_id: int,
+               added: Iterable[int], removed: Iterable[int]) -> None:
+        """Запоминает изменение тегов объекта; применяется к индексу после коммита"""
+        change_seq(db, user_id)  # коммит продвинет индекс пользователя на номер этой транзакции
+        changes = db.info.setdefault(_CHANGES_KEY, [])
+        changes.append((user_id, is_note, item_id, tuple(added), tuple(removed)))
+
+    def commit(self, session: Session, committed: Dict[int, int], changes: Dict[int, list]) -> None:
+        """Продвигает индексы пользователей на номера закоммиченной транзакции
+        (user_id -> seq) и применяет ее изменения тегов из record().
+        changes (измененные объекты для синхронизации) индексу не нужны"""
+        tag_changes = session.info.pop(_CHANGES_KEY, [])
+        if not committed:
+            return
+        with self._lock:
+            for user_id, seq in committed.items():
+                for is_note in (True, False):
+                    index = self._indexes.get((user_id, is_note))
+                    if index is None or index.seq == seq:
+                        continue
+                    if index.seq != seq - 1:
+                        del self._indexes[(user_id, is_note)]
+                        continue
+                    for change_user, change_is_note, item_id, added, removed in tag_changes:
+                        if change_user != user_id or change_is_note != is_note:
+                            continue
+                        for tag_id in removed:
+                            index.remove(tag_id, item_id)
+                        for tag_id in added:
+                            index.add(tag_id, item_id)
+                    index.seq = seq
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает индексы пользователя (после записи в обход record)"""
+        with self._lock:
+            self._indexes.pop((user_id, True), None)
+            self._indexes.pop((user_id, False), None)
+
+
+tag_index = TagIndex(max_users=settings.tag_index_max_users)
+on_user_commit(tag_index.commit)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session) -> None:
+    session.info.pop(_CHANGES_KEY, None)
@@ -0,0 +1,69 @@
+"""
+Счетчики использования тегов пользователем (таблица tag_usage).
+
+Меняются в той же транзакции, что и связи note_tag/task_tag: при изменении
+набора тегов заметки или задачи и при ее удалении. Строка тега в общей таблице
+tags остается, даже если его больше никто не использует: списки тегов строятся
+по tag_usage, а удаление позволило бы SQLite выдать тот же id новому тегу, пока
+другие процессы держат старое имя в tag_cache (и гонялось бы с созданием тега
+в _get_or_create_tags).
+"""
+from typing import Dict, Iterable, List
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..models.todo import Tag, TagUsage
+from ..schemas import TagUsageOut
+
+
+def adjust_tag_usage(db: Session, user_id: int, added: Iterable[int], removed: Iterable[int], is_note: bool) -> None:
+    """Учитывает добавленные и снятые теги одной заметки (is_note) или задачи"""
+    added, removed = set(added), set(removed)
+    counter = "note_count" if is_note else "task_count"
+    column = TagUsage.note_count if is_note else TagUsage.task_count
+
+    if added:
+        add_tag_usage(db, user_id, {tag_id: 1 for tag_id in added}, is_note)
+
+    if removed:
+        db.execute(update(TagUsage).where(
+            TagUsage.user_id == user_id, TagUsage.tag_id.in_(removed)
+        ).values({counter: column - 1}))
+        db.execute(delete(TagUsage).where(
+            TagUsage.user_id == user_id,
+            TagUsage.tag_id.in_(removed),
+            TagUsage.note_count <= 0,
+            TagUsage.task_count <= 0,
+        ))
+
+
+def add_tag_usage(db: Session, user_id: int, counts: Dict[int, int], is_note: bool) -> None:
+    """Увеличивает счетчики тегов на counts (tag_id -> сколько заметок или задач добавлено)"""
+    if not counts:
+        return
+    counter = "note_count" if is_note else "task_count"
+    column = TagUsage.note_count if is_note else TagUsage.task_count
+    stmt = insert(TagUsage).values([
+        {"user_id": user_id, "tag_id": tag_id, counter: count} for tag_id, count in counts.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TagUsage.user_id, TagUsage.tag_id],
+        set_={counter: column + stmt.excluded[counter]},
+    ))
+
+
+def user_tags(db: Session, user_id: int) -> List[TagUsageOut]:
+    """Теги пользователя: сначала самые используемые, при равенстве - по имени"""
+    usage = TagUsage.note_count + TagUsage.task_count
+    rows = db.query(Tag, TagUsage.note_count, TagUsage.task_count).join(
+        TagUsage, TagUsage.tag_id == Tag.id
+    ).filter(
+        TagUsage.user_id == user_id
+    ).order_by(usage.desc(), Tag.name.asc()).all()
+    return [
+        TagUsageOut(id=tag.id, name=tag.name, color=tag.color, note_count=note_count, task_count=task_count)
+        for tag, note_count, task_count in rows
+    ]
+
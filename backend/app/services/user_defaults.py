@@ -0,0 +1,104 @@
+"""
+Данные пользователя, которые должны существовать всегда: папка "Все" и настройки.
+
+Они создаются в той же транзакции, что и сам пользователь (create_user), а для
+пользователей, созданных раньше, - при старте приложения (provision_missing_defaults).
+Поэтому GET-эндпоинты только читают их и ничего не пишут.
+"""
+import logging
+import threading
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from ..models.todo import Folder
+from ..models.user import User
+from ..models.user_settings import UserSettings
+from .sync_service import mark_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FOLDER_NAME = "Все"
+
+# user_id -> id папки "Все". Папку нельзя удалить, поэтому id не меняется
+_default_folder_ids: Dict[int, int] = {}
+_lock = threading.Lock()
+
+
+def _add_defaults(db: Session, user_id: int, folder: bool = True, settings: bool = True) -> None:
+    """Добавляет в сессию папку "Все" и настройки по умолчанию (без коммита)"""
+    if folder:
+        default_folder = Folder(user_id=user_id, name=DEFAULT_FOLDER_NAME, is_default=True)
+        mark_changed(db, user_id, default_folder)
+        db.add(default_folder)
+    if settings:
+        user_settings = UserSettings(
+            user_id=user_id,
+            language="ru",
+            theme="dark",
+            notification_times_minutes=[30]  # По умолчанию одно уведомление за 30 минут
+        )
+        mark_changed(db, user_id, user_settings)
+        db.add(user_settings)
+
+
+def create_user(db: Session, username: str, uuid: str) -> User:
+    """Создает пользователя вместе с папкой "Все" и настройками (без коммита)"""
+    user = User(username=username, uuid=uuid)
+    db.add(user)
+    db.flush()  # Нужен id пользователя
+    _add_defaults(db, user.id)
+    db.flush()
+    return user
+
+
+def default_folder_id(db: Session, user_id: int) -> int | None:
+    """id папки "Все" пользователя; после первого обращения берется из памяти"""
+    folder_id = _default_folder_ids.get(user_id)
+    if folder_id is None:
+        folder_id = db.query(Folder.id).filter(
+            Folder.user_id == user_id,
+            Folder.is_default == True
+        ).scalar()
+        if folder_id is not None:
+            with _lock:
+                _default_folder_ids[user_id] = folder_id
+    return folder_id
+
+
+def get_or_create_default_folder_id(db: Session, user_id: int) -> int:
+    """id папки "Все" для записывающих эндпоинтов: если папки почему-то нет, создает ее (без коммита)"""
+    folder_id = default_folder_id(db, user_id)
+    if folder_id is None:
+        # В кэш не кладем: транзакция еще может откатиться
+        folder = Folder(user_id=user_id, name=DEFAULT_FOLDER_NAME, is_default=True)
+        mark_changed(db, user_id, folder)
+        db.add(folder)
+        db.flush()
+        folder_id = folder.id
+    return folder_id
+
+
+def get_settings(db: Session, user_id: int) -> UserSettings | None:
+    """Настройки пользователя (только чтение)"""
+    return db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+
+
+def provision_missing_defaults(db: Session) -> None:
+    """Создает папку "Все" и настройки пользователям, у которых их нет (при старте приложения)"""
+    without_folder = db.query(User.id).filter(
+        ~User.id.in_(db.query(Folder.user_id).filter(Folder.is_default == True))
+    ).all()
+    without_settings = db.query(User.id).filter(
+        ~User.id.in_(db.query(UserSettings.user_id))
+    ).all()
+    folder_users = {user_id for user_id, in without_folder}
+    settings_users = {user_id for user_id, in without_settings}
+    for user_id in folder_users | settings_users:
+        _add_defaults(db, user_id, folder=user_id in folder_users, settings=user_id in settings_users)
+    db.commit()
+    if folder_users or settings_users:
+        logger.info(
+            f"Созданы данные по умолчанию: папка \"Все\" для {len(folder_users)}, "
+            f"настройки для {len(settings_users)} пользователей"
+        )
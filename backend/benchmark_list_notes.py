@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации списка заметок (GET /api/notes).
+
+Создает временную SQLite базу с пользователем на 5000 заметок с тегами и
+сравнивает старый путь (ORM + joinedload + NoteOut + pydantic) с JSON-проекцией
+в SQL (app/projections.py). Кэш ответов отключается, чтобы мерить именно сборку.
+
+Запуск: python benchmark_list_notes.py [количество_заметок]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DB_FILE = Path(tempfile.mkdtemp()) / "benchmark.sqlite3"
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+
+from typing import Any
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+
+from app.db import Base, SessionLocal, engine
+from app.models.user import User
+from app.models.todo import Note, Tag, Folder, note_tag
+from app.projections import note_json, json_array_body
+from app.serializers import note_to_out
+
+NOTES_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+TAGS_COUNT = 50
+ROUNDS = 5
+
+
+def fill_database():
+    """Заполняет базу одним пользователем с NOTES_COUNT заметками"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = User(username="benchmark", uuid="benchmark")
+    db.add(user)
+    db.flush()
+    folder = Folder(user_id=user.id, name="Все", is_default=True)
+    db.add(folder)
+    tags = [Tag(name=f"тег{i}", color="#AED6F1") for i in range(TAGS_COUNT)]
+    db.add_all(tags)
+    db.flush()
+
+    content = "Текст заметки " * 20
+    db.execute(insert(Note), [
+        {"user_id": user.id, "folder_id": folder.id, "title": f"Заметка {i}", "content": content,
+         "is_favorite": i % 100 == 0}
+        for i in range(NOTES_COUNT)
+    ])
+    note_ids = [row[0] for row in db.query(Note.id).all()]
+    db.execute(insert(note_tag), [
+        {"note_id": note_id, "tag_id": tags[(note_id + k) % TAGS_COUNT].id}
+        for note_id in note_ids for k in range(3)
+    ])
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+def orm_path(db, user_id) -> bytes:
+    """Старая реализация list_notes: ORM-объекты и валидация pydantic"""
+    notes = db.query(Note).options(joinedload(Note.tags)).filter(Note.user_id == user_id).order_by(
+        Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc()
+    ).all()
+    return TypeAdapter(Any).dump_json([note_to_out(n) for n in notes])
+
+
+def projection_path(db, user_id) -> bytes:
+    """Новая реализация: готовый JSON каждой строки из SQLite"""
+    rows = db.query(note_json()).filter(Note.user_id == user_id).order_by(
+        Note.is_favorite.desc(), Note.updated_at.desc(), Note.id.desc()
+    ).all()
+    return json_array_body(row[0] for row in rows)
+
+
+def measure(func, user_id):
+    """Лучшее время из ROUNDS прогонов, каждый в новой сессии"""
+    best = None
+    body = b""
+    for _ in range(ROUNDS):
+        db = SessionLocal()
+        started = time.perf_counter()
+        body = func(db, user_id)
+        elapsed = time.perf_counter() - started
+        db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    print(f"База: {DB_FILE}")
+    print(f"Заполняю базу: {NOTES_COUNT} заметок, по 3 тега на заметку...")
+    user_id = fill_database()
+
+    orm_time, orm_body = measure(orm_path, user_id)
+    projection_time, projection_body = measure(projection_path, user_id)
+
+    print(f"ORM + NoteOut:   {orm_time * 1000:8.1f} мс")
+    print(f"JSON-проекция:   {projection_time * 1000:8.1f} мс")
+    print(f"Ускорение:       {orm_time / projection_time:8.1f}x")
+    print(f"Размер ответа:   {len(projection_body)} байт")
+    print(f"Ответы совпадают: {'да' if orm_body == projection_body else 'НЕТ'}")
+
+    DB_FILE.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Пересоздание полнотекстового индекса поиска (notes_fts, tasks_fts).
+
+Индекс поддерживается триггерами и заполняется автоматически при первом
+запуске приложения. Скрипт нужен, если индекс рассинхронизировался
+(например, после ручной правки БД) или изменился формат индексации.
+"""
+from app.db import engine
+from app.services.search_service import ensure_search_index, rebuild_search_index
+
+
+def main():
+    print("Пересоздаю индекс поиска...")
+    ensure_search_index(engine)
+    with engine.begin() as conn:
+        rebuild_search_index(conn)
+    print("Индекс поиска пересоздан")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Пересчет флага notes.has_deadline_notifications по таблице deadlines.
+
+Флаг меняют эндпоинты дедлайнов в той же транзакции, что и сам дедлайн, и
+заполняется автоматически при добавлении колонки. Скрипт нужен, если флаг
+рассинхронизировался (например, после ручной правки БД). Исправленные заметки
+получают новый change_seq, и клиенты получат их при следующей синхронизации.
+"""
+from app.db import engine
+from app.migrations import recompute_note_deadline_flags
+
+
+def main():
+    print("Пересчитываю флаги уведомлений дедлайнов у заметок...")
+    with engine.begin() as conn:
+        fixed = recompute_note_deadline_flags(conn)
+    print(f"Исправлено заметок: {fixed}")
+
+
+if __name__ == "__main__":
+    main()
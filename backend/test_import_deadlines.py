@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Скрипт для проверки импорта дедлайнов (POST /api/import).
+Дедлайн в прошлом импортируется с выключенными уведомлениями, даже если в
+файле они включены: иначе планировщик сразу разослал бы "срок истек" по всем
+старым дедлайнам. Дедлайн в будущем сохраняет notification_enabled из файла.
+"""
+import json
+import requests
+import sys
+import time
+
+# Настройки
+API_URL = "http://localhost:8000"  # Измените на ваш URL
+INIT_DATA = "user_id=5107785&first_name=Импорт&username=import_deadlines_test"
+
+TODO_CONTENT = json.dumps({"type": "todo", "items": []})
+IMPORT_LINES = [
+    {"type": "note", "id": 1, "title": "Прошедший дедлайн", "content": TODO_CONTENT},
+    {"type": "note", "id": 2, "title": "Будущий дедлайн", "content": TODO_CONTENT},
+    {"type": "deadline", "note_id": 1, "deadline_at": "2020-01-01T10:00:00Z", "notification_enabled": True},
+    {"type": "deadline", "note_id": 2, "deadline_at": "2099-01-01T10:00:00Z", "notification_enabled": True},
+]
+
+
+def check(name: str, actual, expected) -> bool:
+    ok = actual == expected
+    print(f"{'✅' if ok else '❌'} {name}: {actual}" + ("" if ok else f" (ожидалось {expected})"))
+    return ok
+
+
+def main():
+    """Главная функция"""
+    print("=" * 60)
+    print("ПРОВЕРКА ИМПОРТА ДЕДЛАЙНОВ")
+    print("=" * 60)
+
+    session = requests.Session()
+    try:
+        response = session.post(f"{API_URL}/auth/webapp-init", json={"initData": INIT_DATA}, timeout=10)
+    except requests.exceptions.ConnectionError:
+        print(f"❌ ОШИБКА: Не удалось подключиться к серверу {API_URL}")
+        sys.exit(1)
+    response.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    body = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in IMPORT_LINES).encode()
+    job = session.post(f"{API_URL}/api/import", data=body).json()
+    while job["status"] not in ("done", "failed"):
+        time.sleep(0.5)
+        job = session.get(f"{API_URL}/api/import/{job['id']}").json()
+    if not check("статус импорта", job["status"], "done"):
+        sys.exit(1)
+
+    notes = {note["title"]: note for note in session.get(f"{API_URL}/api/notes").json()}
+    past_note, future_note = notes["Прошедший дедлайн"], notes["Будущий дедлайн"]
+    deadlines = {deadline["note_id"]: deadline for deadline in session.get(f"{API_URL}/api/deadlines").json()}
+
+    results = [
+        check("уведомления прошедшего дедлайна", deadlines[past_note["id"]]["notification_enabled"], False),
+        check("флаг заметки с прошедшим дедлайном", past_note["has_deadline_notifications"], False),
+        check("уведомления будущего дедлайна", deadlines[future_note["id"]]["notification_enabled"], True),
+        check("флаг заметки с будущим дедлайном", future_note["has_deadline_notifications"], True),
+    ]
+
+    for note in (past_note, future_note):
+        session.delete(f"{API_URL}/api/notes/{note['id']}")
+    print()
+    print("✅ УСПЕХ" if all(results) else "❌ ОШИБКА")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
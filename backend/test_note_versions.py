@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Скрипт для проверки версий заметок при отложенной записи (NOTE_WRITE_BEHIND=1).
+Два клиента отправляют дельту от одной и той же версии: первая принимается,
+вторая должна получить 409. Дельта от change_seq до отложенных правок и от
+промежуточной версии тоже должна получить 409.
+
+Backend должен быть запущен с NOTE_WRITE_BEHIND=1 и большой задержкой записи,
+например NOTE_WRITE_BEHIND_IDLE_MS=60000, чтобы правки не успели сброситься.
+"""
+import requests
+import sys
+
+# Настройки
+API_URL = "http://localhost:8000"  # Измените на ваш URL
+INIT_DATA = "user_id=5107784&first_name=Версия&username=note_versions_test"
+
+TEXT_OP = {"op": "text", "start": 0, "end": 0, "text": "!"}
+
+
+def login(session: requests.Session) -> None:
+    response = session.post(f"{API_URL}/auth/webapp-init", json={"initData": INIT_DATA}, timeout=10)
+    response.raise_for_status()
+    session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+
+def check(name: str, actual, expected) -> bool:
+    ok = actual == expected
+    print(f"{'✅' if ok else '❌'} {name}: {actual}" + ("" if ok else f" (ожидалось {expected})"))
+    return ok
+
+
+def main():
+    """Главная функция"""
+    print("=" * 60)
+    print("ПРОВЕРКА ВЕРСИЙ ЗАМЕТОК ПРИ ОТЛОЖЕННОЙ ЗАПИСИ")
+    print("=" * 60)
+
+    first, second = requests.Session(), requests.Session()
+    try:
+        login(first)
+        login(second)
+    except requests.exceptions.ConnectionError:
+        print(f"❌ ОШИБКА: Не удалось подключиться к серверу {API_URL}")
+        sys.exit(1)
+
+    note = first.post(f"{API_URL}/api/notes", json={"title": "Версии", "content": "abc"}).json()
+    note_id = note["id"]
+    base = note["version"]
+
+    middle = first.patch(f"{API_URL}/api/notes/{note_id}", json={"content": "abcd"}).json()["version"]
+    latest = first.patch(f"{API_URL}/api/notes/{note_id}", json={"content": "abcde"}).json()["version"]
+
+    def delta(session: requests.Session, version: int) -> int:
+        return session.patch(
+            f"{API_URL}/api/notes/{note_id}/delta",
+            json={"base_version": version, "ops": [TEXT_OP]}
+        ).status_code
+
+    results = [
+        check("версии правок различаются", len({base, middle, latest}), 3),
+        check("GET отдает версию последней правки", second.get(f"{API_URL}/api/notes/{note_id}").json()["version"], latest),
+        check("дельта от версии до правок", delta(second, base), 409),
+        check("дельта от промежуточной версии", delta(second, middle), 409),
+        check("первый клиент от последней версии", delta(first, latest), 200),
+        check("второй клиент от той же версии", delta(second, latest), 409),
+    ]
+
+    first.delete(f"{API_URL}/api/notes/{note_id}")
+    print()
+    print("✅ УСПЕХ" if all(results) else "❌ ОШИБКА")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,10 @@ import uvicorn
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.db import SessionLocal
 from app.models.user import User
+from app.services.user_defaults import create_user
+# Изменения данных отсюда тоже публикуются в поток GET /api/events
+# (другим процессам они доходят при EVENTS_BROKER=sqlite)
+import app.services.events  # noqa: F401
 from app.core.config import settings
 
 # Настройка логирования
@@ -185,8 +189,7 @@ def _upsert_user_from_webhook(user_data: dict) -> None:
                 username = f"{username}_{user_id}"
             
             # Создаем нового пользователя
-            new_user = User(username=username, uuid=uuid)
-            db.add(new_user)
+            new_user = create_user(db, username, uuid)
             db.commit()
             db.refresh(new_user)
             